@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Dict, Optional
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
@@ -6,9 +6,13 @@ from langchain.chat_models import init_chat_model
 from langchain_core.tools import tool
 from langchain_core.messages import ToolMessage
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+from observability import get_logger, span, timed
 
 load_dotenv()
+log = get_logger(__name__)
 
 
 class State(TypedDict):  # TypedDict is a type that defines the structure of the state
@@ -17,23 +21,41 @@ class State(TypedDict):  # TypedDict is a type that defines the structure of the
     ]  # Annotated is a type that annotates the state with the type of the messages
 
 
-graph_builder = StateGraph(
-    State
-)  # StateGraph is a class that creates a graph of the state
+CHAT_MODEL = os.getenv(
+    "CHAT_MODEL", "openai:gpt-4o-mini"
+)  # any init_chat_model id, or "fake" for load tests without OpenAI (see benchmarks/fake_llm.py)
 
 
-llm = init_chat_model("openai:gpt-4o-mini")  # Initialize the chat model
+def create_chat_model(model: str = CHAT_MODEL):
+    if model == "fake":
+        from benchmarks.fake_llm import FakeChatModel
+
+        return FakeChatModel.from_env()
+    return init_chat_model(model)
 
 
 @tool
-def rag_search(query: str) -> str:
-    """Search documents using RAG for semantically similar content."""
+async def rag_search(
+    query: str,
+    fiscal_year: Optional[int] = None,
+    company_or_filename: Optional[str] = None,
+    doc_type: Optional[str] = None,
+) -> str:
+    """Search documents using RAG for semantically similar content.
+
+    Narrow the search when the question names them: fiscal_year (e.g. 2022),
+    company_or_filename (part of the file name, e.g. "NetSol") and doc_type
+    (annual_report, quarterly_report, financial_statement, presentation or other)."""
     try:
         from tools.RAG import rag_tool  # get the rag tool from the tools folder
-        import asyncio
 
-        results = asyncio.run(
-            rag_tool.search_documents(query)
+        results = await rag_tool.search_documents(
+            query,
+            filters={
+                "fiscal_year": fiscal_year,
+                "filename": company_or_filename,
+                "doc_type": doc_type,
+            },
         )  # search the documents for semantically similar document chunks
         return rag_tool.format_results(results)  # format the results
     except Exception as e:
@@ -41,12 +63,14 @@ def rag_search(query: str) -> str:
 
 
 @tool
-def web_search(query: str) -> str:
+async def web_search(query: str) -> str:
     """Search the web for real-time information using Tavily."""
     try:
-        from tools.Tavily import tavily_tool
+        from tools.Tavily import web_search_client
 
-        results = tavily_tool.invoke({"query": query})
+        results = await web_search_client.ainvoke(
+            {"query": query}
+        )  # cached and coalesced, repeat searches skip the multi-second Tavily call
 
         if not results.get("results"):
             return "No search results found."
@@ -76,15 +100,17 @@ def web_search(query: str) -> str:
 
 
 tools = [rag_search, web_search]  # tools is a list of the tools
+tools_by_name = {tool.name: tool for tool in tools}  # registry used by call_tools
 
-
-llm_with_tools = llm.bind_tools(
-    tools
-)  # bind_tools is a method that binds the tools to the LLM
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))  # tool calls of one turn running at once
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))  # seconds before a tool call is reported as failed
 
 
-def chatbot(state: State):
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+@timed("node.chatbot")
+async def chatbot(state: State):
+    return {
+        "messages": [await get_agent().llm_with_tools.ainvoke(state["messages"])]
+    }  # awaiting the LLM lets other conversations run while this one waits on OpenAI
 
 
 def should_continue(
@@ -102,91 +128,173 @@ def should_continue(
         return "end"
 
 
-def call_tools(state: State):
+async def _run_tool(tool_call, limiter: asyncio.Semaphore) -> ToolMessage:
+    tool_name = tool_call["name"]  # get the name of the tool
+    tool = tools_by_name.get(tool_name)  # dict lookup instead of scanning the tools list
+    if tool is None:
+        return ToolMessage(
+            content=f"Unknown tool: {tool_name}", tool_call_id=tool_call["id"]
+        )
+    async with limiter:
+        try:
+            with span(f"tool.{tool_name}"):
+                result = await asyncio.wait_for(
+                    tool.ainvoke(tool_call["args"]), TOOL_TIMEOUT
+                )  # the timeout starts once the tool actually runs
+            # Use ToolMessage format as per LangGraph docs
+            return ToolMessage(content=result, tool_call_id=tool_call["id"])
+        except asyncio.TimeoutError:
+            return ToolMessage(
+                content=f"Error executing {tool_name}: timed out after {TOOL_TIMEOUT}s",
+                tool_call_id=tool_call["id"],
+            )
+        except Exception as e:
+            return ToolMessage(
+                content=f"Error executing {tool_name}: {str(e)}",
+                tool_call_id=tool_call["id"],
+            )
+
+
+@timed("node.tools")
+async def call_tools(state: State):
     messages = state["messages"]
     last_message = messages[-1]
 
-    for (
-        tool_call
-    ) in (
-        last_message.tool_calls
-    ):  # for each tool call in the last message, we execute the tool.
-        tool_name = tool_call["name"]  # get the name of the tool
-        tool_args = tool_call["args"]  # get the arguments of the tool
-
-        # Find and execute the tool
-        for (
-            tool
-        ) in (
+    limiter = asyncio.Semaphore(TOOL_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_run_tool(tool_call, limiter) for tool_call in last_message.tool_calls)
+    )  # every tool call of this turn runs at once; gather keeps the original order
+
+    return {"messages": list(results)}
+
+
+def build_graph():
+    graph_builder = StateGraph(
+        State
+    )  # StateGraph is a class that creates a graph of the state
+
+    # Add nodes to the graph
+    graph_builder.add_node(
+        "chatbot", chatbot
+    )  # chatbot is the node that handles the conversation
+    graph_builder.add_node("tools", call_tools)  # tools node handles tool execution
+
+    # Add edges
+    graph_builder.add_edge(START, "chatbot")  # connect the start to the chatbot node
+    graph_builder.add_conditional_edges(
+        "chatbot", should_continue, {"tools": "tools", "end": END}
+    )  # conditional routing from chatbot
+    graph_builder.add_edge("tools", "chatbot")  # connect tools back to chatbot
+
+    return graph_builder.compile()  # compile the graph
+
+
+class Agent:
+    def __init__(self, model: str = CHAT_MODEL):
+        self.llm = create_chat_model(model)  # Initialize the chat model
+        self.llm_with_tools = self.llm.bind_tools(
             tools
-        ):  # for each tool in the tools list, we check if the name of the tool is the same as the name of the tool call.
-            if (
-                tool.name == tool_name
-            ):  # if the name of the tool is the same as the name of the tool call, then we execute the tool.
-                try:
-                    result = tool.invoke(tool_args)
-                    # Use ToolMessage format as per LangGraph docs
-                    messages.append(
-                        ToolMessage(  # append the result of the tool to the messages list.
-                            content=result, tool_call_id=tool_call["id"]
-                        )
-                    )
-                except Exception as e:
-                    messages.append(
-                        ToolMessage(
-                            content=f"Error executing {tool_name}: {str(e)}",
-                            tool_call_id=tool_call["id"],
-                        )
-                    )
-                break
-
-    return {"messages": messages}
-
-
-# Add nodes to the graph
-graph_builder.add_node(
-    "chatbot", chatbot
-)  # chatbot is the node that handles the conversation
-graph_builder.add_node("tools", call_tools)  # tools node handles tool execution
-
-# Add edges
-graph_builder.add_edge(START, "chatbot")  # connect the start to the chatbot node
-graph_builder.add_conditional_edges(
-    "chatbot", should_continue, {"tools": "tools", "end": END}
-)  # conditional routing from chatbot
-graph_builder.add_edge("tools", "chatbot")  # connect tools back to chatbot
-
-graph = graph_builder.compile()  # compile the graph
+        )  # bind_tools is a method that binds the tools to the LLM
+        self.graph = build_graph()
+
+
+_agent: Optional[Agent] = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> Agent:
+    """The chat model and compiled graph, built on first use or by the startup
+    warm-up (main.lifespan) instead of when this module is imported."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = Agent()
+    return _agent
+
+
+def get_llm():
+    return get_agent().llm
+
+
+def _build_messages(
+    user_message: str, conversation_history: list = None, summary: str = None
+) -> list:
+    # Build messages from conversation history
+    messages = []
+    if summary:  # older turns that no longer fit the token budget, condensed
+        messages.append(
+            {
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+            }
+        )
+    if conversation_history:
+        for msg in conversation_history:
+            messages.append(
+                {"role": "user", "content": msg[0]}
+            )  # index zero because user prompts first
+            messages.append(
+                {"role": "assistant", "content": msg[1]}
+            )  # index one becuase model responds second
+
+    messages.append(
+        {"role": "user", "content": user_message}
+    )  # add the current user message
+    return messages
 
 
 async def run_react_agent(
-    user_message: str, conversation_history: list = None
+    user_message: str, conversation_history: list = None, summary: str = None
 ) -> (
     str
 ):  # this method runs the ReAct agent with a user message and conversation history
     try:
-        # Build messages from conversation history
-        messages = []
-        if conversation_history:
-            for msg in conversation_history:
-                messages.append(
-                    {"role": "user", "content": msg[0]}
-                )  # index zero because user prompts first
-                messages.append(
-                    {"role": "assistant", "content": msg[1]}
-                )  # index one becuase model responds second
-
-        messages.append(
-            {"role": "user", "content": user_message}
-        )  # add the current user message
-
         initial_state = {
-            "messages": messages
+            "messages": _build_messages(user_message, conversation_history, summary)
         }  # setting the initial state with full conversation history
-        result = graph.invoke(initial_state)  # invoke the graph with the initial state
+        result = await get_agent().graph.ainvoke(
+            initial_state
+        )  # invoke the graph with the initial state without blocking the event loop
         last_message = result["messages"][
             -1
         ]  # get the last message from the result by indexing the messages list
         return last_message.content
     except Exception as e:
+        log.exception("agent_failed")
         return f"Error running agent: {str(e)}"
+
+
+TOOL_STATUS = {
+    "rag_search": "Searching documents…",
+    "web_search": "Searching the web…",
+}  # shown to the user while a tool runs
+
+
+async def stream_react_agent(
+    user_message: str, conversation_history: list = None, summary: str = None
+) -> AsyncIterator[Dict]:
+    """Run the agent and yield events as they happen:
+    {"type": "token", "content"} for each LLM text token,
+    {"type": "tool", "name", "status": "start" | "end", "message"} around tool calls,
+    and finally {"type": "final", "content"} with the full answer."""
+    initial_state = {
+        "messages": _build_messages(user_message, conversation_history, summary)
+    }
+    final_answer = ""
+    async for event in get_agent().graph.astream_events(initial_state, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            if content:  # tool-call chunks have no text
+                yield {"type": "token", "content": content}
+        elif kind == "on_chat_model_end":
+            final_answer = event["data"]["output"].content  # the last LLM message is the answer
+        elif kind in ("on_tool_start", "on_tool_end") and event["name"] in tools_by_name:
+            yield {
+                "type": "tool",
+                "name": event["name"],
+                "status": "start" if kind == "on_tool_start" else "end",
+                "message": TOOL_STATUS.get(event["name"], f"Running {event['name']}…"),
+            }
+    yield {"type": "final", "content": final_answer}
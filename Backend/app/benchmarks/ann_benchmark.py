@@ -0,0 +1,123 @@
+"""Recall@k and latency of the IVF backend against exact search.
+
+Run from Backend/app:
+    python -m benchmarks.ann_benchmark --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from tools.ann_index import IVFIndex
+from tools.vector_index import VectorIndex
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, rng, block: int = 100000):
+    """Unit vectors drawn around random topic centres, which is closer to real
+    sentence embeddings than uniform noise (and harder than it for IVF)."""
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    for start in range(0, n, block):
+        size = min(block, n - start)
+        labels = rng.integers(0, clusters, size)
+        noise = rng.normal(scale=1.0, size=(size, dim)).astype(np.float32)
+        yield start, centres[labels] + noise
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def run(size: int, dim: int, k: int, queries: int, nprobes, seed: int):
+    rng = np.random.default_rng(seed)
+    index = VectorIndex()
+    for start, vectors in synthetic_corpus(size, dim, max(16, size // 1000), rng):
+        index.add(
+            vectors,
+            [
+                {"filename": "synthetic", "chunk_index": start + i, "text": ""}
+                for i in range(len(vectors))
+            ],
+        )
+
+    # queries are perturbed corpus points, like a paraphrase of a stored chunk
+    picks = rng.choice(size, queries, replace=False)
+    query_vectors = index.matrix[picks] + rng.normal(
+        scale=0.02, size=(queries, dim)
+    ).astype(np.float32)
+
+    def measure(mode):
+        found, latencies = [], []
+        for q in query_vectors:
+            start = time.perf_counter()
+            results = index.search(q, k, mode)
+            latencies.append(time.perf_counter() - start)
+            found.append({r["chunk_index"] for r in results})
+        return found, latencies
+
+    truth, exact_latencies = measure("exact")
+    report = {
+        "size": size,
+        "dim": dim,
+        "k": k,
+        "exact": {
+            "p50_ms": percentile_ms(exact_latencies, 50),
+            "p99_ms": percentile_ms(exact_latencies, 99),
+        },
+        "ivf": [],
+    }
+
+    ivf = IVFIndex(min_train_size=0)
+    start = time.perf_counter()
+    ivf.train(index.matrix)
+    report["ivf_train_s"] = time.perf_counter() - start
+    index.register_backend(ivf, indexed_rows=index.size)
+
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        found, latencies = measure("ivf")
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        report["ivf"].append(
+            {
+                "nlist": len(ivf.centroids),
+                "nprobe": nprobe,
+                f"recall@{k}": float(recall),
+                "p50_ms": percentile_ms(latencies, 50),
+                "p99_ms": percentile_ms(latencies, 99),
+            }
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)  # all-MiniLM-L6-v2 output size
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    reports = []
+    for size in args.sizes:
+        report = run(size, args.dim, args.k, args.queries, args.nprobe, args.seed)
+        reports.append(report)
+        print(
+            f"\nN={size:,}  exact p50={report['exact']['p50_ms']:.2f}ms "
+            f"p99={report['exact']['p99_ms']:.2f}ms  (ivf train {report['ivf_train_s']:.1f}s)"
+        )
+        for row in report["ivf"]:
+            print(
+                f"  ivf nlist={row['nlist']:<5} nprobe={row['nprobe']:<3} "
+                f"recall@{args.k}={row[f'recall@{args.k}']:.3f} "
+                f"p50={row['p50_ms']:.2f}ms p99={row['p99_ms']:.2f}ms"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Open-loop load generator for /chat/send and /chat/stream.
+
+Requests start at a fixed rate whether or not earlier ones have finished,
+as real users would send them. The report covers throughput, latency
+percentiles (and time to first token when streaming) and event-loop lag.
+
+By default the app runs in this process with the fake chat model, the fake
+web search and an in-memory MongoDB, so nothing external is needed and the
+lag measured is the server's own event loop. Run from Backend/app:
+    python -m benchmarks.chat_load --rps 20 --duration 30
+    python -m benchmarks.chat_load --endpoint stream --rps 50 --json load.json
+
+Against a running server started with CHAT_MODEL=fake WEB_SEARCH_BACKEND=fake
+(the lag is then the load generator's own loop):
+    python -m benchmarks.chat_load --url http://localhost:8000 --rps 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import httpx
+
+QUESTIONS = [
+    "What was NetSol's net income in {year}?",
+    "How did total revenue change in {year}?",
+    "Summarise the outlook section of the {year} annual report.",
+    "What are the latest news about NetSol Technologies?",
+    "Compare operating income for {year} and {previous}.",
+]
+
+
+def percentiles_ms(values: list) -> dict:
+    if not values:
+        return {}
+    return {
+        **{f"p{q}_ms": round(float(np.percentile(values, q)) * 1000, 2) for q in (50, 95, 99)},
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+async def sample_loop_lag(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    """How late a sleep(interval) wakes up: time the loop was busy with something else."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def send(client: httpx.AsyncClient, message: str, session_id: str, results: list):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/chat/send", json={"message": message, "session_id": session_id})
+        results.append({"ok": response.status_code == 200, "latency": time.perf_counter() - start})
+    except Exception as e:
+        results.append({"ok": False, "latency": time.perf_counter() - start, "error": str(e)})
+
+
+async def stream(client: httpx.AsyncClient, message: str, session_id: str, results: list):
+    start = time.perf_counter()
+    first_token, ok = None, False
+    try:
+        async with client.stream(
+            "POST", "/chat/stream", json={"message": message, "session_id": session_id}
+        ) as response:
+            async for line in response.aiter_lines():
+                if line == "event: token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif line == "event: done":
+                    ok = True
+                elif line == "event: error":
+                    break
+        results.append({"ok": ok, "latency": time.perf_counter() - start, "first_token": first_token})
+    except Exception as e:
+        results.append({"ok": False, "latency": time.perf_counter() - start, "error": str(e)})
+
+
+def in_process_client(memory_db: bool) -> httpx.AsyncClient:
+    os.environ.setdefault("CHAT_MODEL", "fake")  # read when REACT and tools.Tavily are imported
+    os.environ.setdefault("WEB_SEARCH_BACKEND", "fake")
+    os.environ.setdefault("MONGODB_DBNAME", "chatbot_load_test")
+    import main
+
+    if memory_db:
+        from benchmarks.fakes import InMemoryDatabase
+
+        main.database = InMemoryDatabase()  # routers and memory look these up at call time
+        main.chat_collection = main.database.chat_sessions
+    transport = httpx.ASGITransport(
+        app=main.app
+    )  # hands over a response once the app has finished it, so first_token needs --url
+    return httpx.AsyncClient(transport=transport, base_url="http://chat-load", timeout=None)
+
+
+async def run(args) -> dict:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        client = in_process_client(not args.mongo)
+        from embeddings import embedding_service
+
+        await asyncio.to_thread(embedding_service.warmup)  # what the lifespan warm-up would do
+
+    request = stream if args.endpoint == "stream" else send
+    rng = np.random.default_rng(0)
+    results, lags, tasks = [], [], []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(lags, stop))
+
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    async with client:
+        for i in range(total):
+            delay = start + i / args.rps - time.perf_counter()  # open loop: keep the schedule
+            if delay > 0:
+                await asyncio.sleep(delay)
+            year = int(rng.integers(2019, 2024))
+            message = QUESTIONS[i % len(QUESTIONS)].format(year=year, previous=year - 1)
+            tasks.append(
+                asyncio.create_task(request(client, message, f"load-{i % args.sessions}", results))
+            )
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    ok = [r for r in results if r["ok"]]
+    return {
+        "endpoint": args.endpoint,
+        "target_rps": args.rps,
+        "requests": total,
+        "succeeded": len(ok),
+        "failed": total - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "elapsed_s": round(elapsed, 2),
+        "latency": percentiles_ms([r["latency"] for r in ok]),
+        "first_token": percentiles_ms([r["first_token"] for r in ok if r.get("first_token")]),
+        "event_loop_lag": percentiles_ms(lags),
+        "lag_measured_in": "load generator" if args.url else "server",
+        "settings": {
+            name: os.getenv(name)
+            for name in ("CHAT_MODEL", "FAKE_LLM_LATENCY", "FAKE_LLM_TOKENS_PER_SECOND",
+                         "FAKE_LLM_SCRIPT", "WEB_SEARCH_BACKEND", "FAKE_SEARCH_LATENCY")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server to load; default runs the app in this process")
+    parser.add_argument("--endpoint", choices=["send", "stream"], default="send")
+    parser.add_argument("--rps", type=float, default=10.0, help="requests started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--sessions", type=int, default=100, help="conversations the requests are spread over")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--mongo", action="store_true", help="in-process: use MONGODB_URL instead of memory")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
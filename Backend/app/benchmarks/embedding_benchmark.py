@@ -0,0 +1,89 @@
+"""Throughput and accuracy of the embedding precisions (float32 / float16 / int8).
+
+Run from Backend/app:
+    python -m benchmarks.embedding_benchmark --texts 2000 --threads 4
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from embeddings import EmbeddingService, PRECISIONS, EMBEDDING_MODEL_NAME
+from tools.ann_index import top_k
+
+SUBJECTS = ["Revenue", "Net income", "Gross profit", "Operating income", "EBITDA", "Total assets"]
+UNITS = ["NFS Ascent", "LeasePak", "Apparo", "WholesalePro", "Cloud Infrastructure", "Consulting Services"]
+REGIONS = ["North America", "Europe", "Asia Pacific", "the Middle East and Africa"]
+
+
+def synthetic_sentences(n: int, rng) -> list:
+    """Annual-report style sentences so token lengths resemble real chunks."""
+    sentences = []
+    for _ in range(n):
+        year = int(rng.integers(2019, 2024))
+        sentences.append(
+            f"{rng.choice(SUBJECTS)} for {rng.choice(UNITS)} in {rng.choice(REGIONS)} "
+            f"reached ${int(rng.integers(1, 900))} million in fiscal {year}, "
+            f"a change of {rng.normal(8, 6):.1f}% compared with {year - 1}, "
+            "driven by new implementations, renewals and continued investment in R&D."
+        )
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--precisions", nargs="+", default=list(PRECISIONS))
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = synthetic_sentences(args.texts, rng)
+    queries = synthetic_sentences(args.queries, rng)
+
+    reference = None
+    reports = []
+    for precision in args.precisions:
+        service = EmbeddingService(args.model, precision, args.threads, args.batch_size)
+        start = time.perf_counter()
+        service.warmup()
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        corpus_vectors = service.encode(corpus)
+        encode_s = time.perf_counter() - start
+        query_vectors = service.encode(queries)
+
+        corpus_vectors /= np.linalg.norm(corpus_vectors, axis=1, keepdims=True)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        report = {
+            "precision": precision,
+            "load_s": round(load_s, 3),
+            "texts_per_s": round(len(corpus) / encode_s, 1),
+        }
+
+        if reference is None:  # the first precision (float32 by default) is the baseline
+            reference = (corpus_vectors, query_vectors)
+        ref_corpus, ref_queries = reference
+        report["mean_cosine_to_baseline"] = float(np.mean(np.sum(corpus_vectors * ref_corpus, axis=1)))
+        overlaps = []
+        for q, ref_q in zip(query_vectors, ref_queries):
+            found = set(top_k(corpus_vectors @ q, args.k).tolist())
+            expected = set(top_k(ref_corpus @ ref_q, args.k).tolist())
+            overlaps.append(len(found & expected) / args.k)
+        report[f"top{args.k}_overlap_with_baseline"] = float(np.mean(overlaps))
+        reports.append(report)
+        print(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""A scripted chat model that behaves like a remote LLM without calling one.
+
+Selected with CHAT_MODEL=fake (see REACT.create_chat_model). Each reply waits
+`latency` seconds, then produces its text at `tokens_per_second`, streaming it
+token by token when the caller streams. Which tool calls are made is decided
+by a script, so load tests exercise the same graph paths as real traffic:
+
+    FAKE_LLM_SCRIPT='[{"tool_calls": [{"name": "rag_search", "args": {"query": "{question}"}}]}]'
+
+Step i of the script is used for the i-th model call after the latest user
+message; once the script runs out the model answers. FAKE_LLM_SCRIPT may
+also be the path of a JSON file.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+DEFAULT_SCRIPT = [{"tool_calls": [{"name": "rag_search", "args": {"query": "{question}"}}]}]
+FILLER = (
+    "Revenue grew on the back of new implementations and renewals while margins held steady "
+    "and investment in research and development continued across all regions"
+).split()
+
+
+def load_script(value: Optional[str]) -> List[Dict]:
+    if not value:
+        return DEFAULT_SCRIPT
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.4  # seconds before the first token
+    tokens_per_second: float = 60.0  # 0 produces the whole reply at once
+    answer_tokens: int = 80
+    script: List[Dict[str, Any]] = DEFAULT_SCRIPT
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.4")),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "60")),
+            answer_tokens=int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "80")),
+            script=load_script(os.getenv("FAKE_LLM_SCRIPT")),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self  # the script decides which tools are called
+
+    def _reply(self, messages: List[BaseMessage]):
+        """(text tokens, tool calls) for the next model call of this conversation."""
+        last_user = max(
+            (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1
+        )
+        question = messages[last_user].content if last_user >= 0 else ""
+        step = sum(1 for m in messages[last_user + 1 :] if isinstance(m, AIMessage))
+
+        if step < len(self.script) and self.script[step].get("tool_calls"):
+            tool_calls = [
+                {
+                    "name": call["name"],
+                    "args": {
+                        key: value.replace("{question}", question) if isinstance(value, str) else value
+                        for key, value in call.get("args", {}).items()
+                    },
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+                for call in self.script[step]["tool_calls"]
+            ]
+            return [], tool_calls
+
+        if step < len(self.script) and self.script[step].get("content"):
+            words = self.script[step]["content"].replace("{question}", question).split()
+        else:
+            words = f"Fake answer to: {question}.".split()
+            words += [FILLER[i % len(FILLER)] for i in range(max(0, self.answer_tokens - len(words)))]
+        return [word if i == 0 else " " + word for i, word in enumerate(words)], []
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens, tool_calls = self._reply(messages)
+        time.sleep(self.latency + len(tokens) * self._token_delay())
+        message = AIMessage(content="".join(tokens), tool_calls=tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens, tool_calls = self._reply(messages)
+        await asyncio.sleep(self.latency + len(tokens) * self._token_delay())
+        message = AIMessage(content="".join(tokens), tool_calls=tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        tokens, tool_calls = self._reply(messages)
+        time.sleep(self.latency)
+        for chunk in self._chunks(tokens, tool_calls):
+            yield chunk
+            time.sleep(self._token_delay())
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens, tool_calls = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(tokens, tool_calls):
+            yield chunk
+            await asyncio.sleep(self._token_delay())
+
+    @staticmethod
+    def _chunks(tokens: List[str], tool_calls: List[Dict]) -> Iterator[ChatGenerationChunk]:
+        if tool_calls:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                        for i, call in enumerate(tool_calls)
+                    ],
+                )
+            )
+        for token in tokens:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
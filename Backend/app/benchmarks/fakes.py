@@ -0,0 +1,169 @@
+"""Local stand-ins for external services, for benchmarks and load tests."""
+
+import asyncio
+import itertools
+
+
+class FakeSearchBackend:
+    """Answers like TavilySearch.ainvoke after a fixed delay, without the network."""
+
+    def __init__(self, latency: float = 1.5, results: int = 5):
+        self.latency = latency
+        self.results = results
+        self.calls = 0
+
+    def _response(self, payload: dict) -> dict:
+        query = payload["query"]
+        return {
+            "query": query,
+            "answer": f"Fake answer for {query}",
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "url": f"https://example.com/{i}",
+                    "content": f"Fake content {i} about {query}. " * 5,
+                    "score": 1.0 - i / 10,
+                }
+                for i in range(self.results)
+            ],
+            "response_time": self.latency,
+        }
+
+    async def ainvoke(self, payload: dict) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._response(payload)
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$exists" in condition and (field in doc) != condition["$exists"]:
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$gt" in condition and (value is None or not value > condition["$gt"]):
+                return False
+            if "$lt" in condition and (value is None or not value < condition["$lt"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return dict(doc)
+    included = {field for field, on in projection.items() if on}
+    projected = {field: doc[field] for field in included if field in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        projected["_id"] = doc["_id"]
+    return projected
+
+
+class InMemoryCursor:
+    def __init__(self, docs: list):
+        self._docs = docs
+
+    def batch_size(self, size: int) -> "InMemoryCursor":
+        return self
+
+    def sort(self, field: str, direction: int = 1) -> "InMemoryCursor":
+        self._docs.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        if count:
+            self._docs = self._docs[:count]
+        return self
+
+    async def to_list(self, length=None) -> list:
+        return self._docs if length is None else self._docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+
+class InMemoryCollection:
+    """The subset of a motor collection that ingestion, index loading and chat
+    history use: equality, $exists, $in, $gt and $lt filters, inclusion projections,
+    sort/limit, and $set updates."""
+
+    def __init__(self):
+        self.docs = {}
+        self._ids = itertools.count(1)
+
+    def find(self, query: dict = None, projection: dict = None) -> InMemoryCursor:
+        return InMemoryCursor(
+            [_project(doc, projection) for doc in self.docs.values() if _matches(doc, query or {})]
+        )
+
+    async def find_one(self, query: dict = None, projection: dict = None):
+        found = await self.find(query, projection).to_list(1)
+        return found[0] if found else None
+
+    async def insert_many(self, docs: list, ordered: bool = True, session=None):
+        for doc in docs:
+            doc.setdefault("_id", next(self._ids))  # motor also sets _id on the caller's dicts
+            self.docs[doc["_id"]] = dict(doc)
+
+    async def insert_one(self, doc: dict, session=None):
+        await self.insert_many([doc])
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False, session=None):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+                return
+        if upsert:
+            await self.insert_one({**query, **update.get("$set", {})})
+
+    async def bulk_write(self, operations: list, ordered: bool = True, session=None):
+        for operation in operations:  # pymongo UpdateOne keeps its arguments in _filter and _doc
+            for doc in self.docs.values():
+                if _matches(doc, operation._filter):
+                    doc.update(operation._doc.get("$set", {}))
+                    break
+
+    async def delete_many(self, query: dict, session=None):
+        for doc_id in [doc_id for doc_id, doc in self.docs.items() if _matches(doc, query)]:
+            del self.docs[doc_id]
+
+    async def count_documents(self, query: dict) -> int:
+        return sum(1 for doc in self.docs.values() if _matches(doc, query))
+
+
+class InMemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self._collections.setdefault(name, InMemoryCollection())
+
+    def __getattr__(self, name: str) -> InMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class _InMemorySession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def start_transaction(self):
+        return self  # writes are applied immediately; good enough for timing
+
+
+class InMemoryClient:
+    """Stands in for AsyncIOMotorClient where only sessions are needed."""
+
+    async def start_session(self):
+        return _InMemorySession()
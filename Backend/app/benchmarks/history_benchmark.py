@@ -0,0 +1,97 @@
+"""Latency of the "last N turns" history lookup as chat_sessions grows.
+
+Needs a reachable MongoDB (MONGODB_URL). Writes to a scratch database that
+is dropped at the end. Run from Backend/app:
+    python -m benchmarks.history_benchmark --sizes 10000 100000 1000000 3000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import motor.motor_asyncio
+from dotenv import load_dotenv
+from database import ensure_indexes, fetch_recent_turns
+
+
+async def grow(collection, current: int, target: int, sessions: int, rng, batch: int = 10000):
+    """Insert messages until the collection holds `target` of them."""
+    base = datetime(2024, 1, 1)
+    while current < target:
+        size = min(batch, target - current)
+        owners = rng.integers(0, sessions, size)
+        await collection.insert_many(
+            [
+                {
+                    "session_id": f"session-{owner}",
+                    "user_message": f"question {current + i}",
+                    "ai_response": "answer " * 50,
+                    "timestamp": base + timedelta(seconds=current + i),
+                }
+                for i, owner in enumerate(owners.tolist())
+            ],
+            ordered=False,
+        )
+        current += size
+    return current
+
+
+async def measure(collection, sessions: int, lookups: int, limit: int, rng):
+    latencies = []
+    for owner in rng.integers(0, sessions, lookups).tolist():
+        start = time.perf_counter()
+        await fetch_recent_turns(collection, f"session-{owner}", limit)
+        latencies.append(time.perf_counter() - start)
+
+    plan = await collection.find({"session_id": "session-0"}).sort("timestamp", -1).limit(
+        limit
+    ).explain()
+    stats = plan.get("executionStats", {})
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000, 3000000])
+    parser.add_argument("--messages-per-session", type=int, default=50)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--database", default="chatbot_history_benchmark")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+    database = client[args.database]
+    await database.chat_sessions.drop()
+    await ensure_indexes(database)
+
+    rng = np.random.default_rng(0)
+    sessions = max(1, max(args.sizes) // args.messages_per_session)
+    reports, count = [], 0
+    try:
+        for size in sorted(args.sizes):
+            count = await grow(database.chat_sessions, count, size, sessions, rng)
+            report = {"messages": count, **await measure(
+                database.chat_sessions, sessions, args.lookups, args.limit, rng
+            )}
+            reports.append(report)
+            print(report)
+    finally:
+        await client.drop_database(args.database)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""Ingestion throughput and search latency of the document pipeline at several corpus sizes.
+
+Corpora are generated with sample_documents/create_sample_pdfs.py (needs
+reportlab) and ingested through DocumentProcessor into an in-memory stand-in
+for MongoDB, so no server is needed. Run from Backend/app:
+    python -m benchmarks.ingest_benchmark --sizes 10 50 200 --json ingest.json
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+from benchmarks.fakes import InMemoryClient, InMemoryDatabase
+from document_processor import DocumentProcessor, count_pdf_pages
+from embeddings import embedding_service
+from tools.RAG import RAGTool
+from tools.vector_index import vector_index
+
+SAMPLE_GENERATOR = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "sample_documents", "create_sample_pdfs.py"
+)
+SUBJECTS = ["net income", "total revenue", "operating income", "gross profit", "R&D investment",
+            "regional revenue", "shareholders equity", "outlook"]
+SETTINGS = ("EMBEDDING_PRECISION", "EMBED_BATCH_SIZE", "EXECUTOR_KIND", "EXECUTOR_WORKERS",
+            "CHUNK_MAX_TOKENS", "CHUNK_OVERLAP_TOKENS", "RAG_SEARCH_MODE", "RAG_HYBRID")
+
+
+def load_generator():
+    spec = importlib.util.spec_from_file_location("create_sample_pdfs", SAMPLE_GENERATOR)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_corpus(count: int, output_dir: str) -> list:
+    """`count` annual reports: the five NetSol ones, then one per (company, year)."""
+    generator = load_generator()
+    paths = []
+    for i in range(count):
+        year = 2019 + i % 5
+        if i < 5:
+            paths.append(generator.create_netsol_specific_document(year, output_dir, verbose=False))
+        else:
+            paths.append(
+                generator.create_sample_document(year, f"Company {i // 5:03d}", output_dir, verbose=False)
+            )
+    return paths
+
+
+def percentiles_ms(latencies: list) -> dict:
+    return {
+        f"p{q}_ms": round(float(np.percentile(latencies, q)) * 1000, 3) for q in (50, 95, 99)
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def ingest(processor: DocumentProcessor, paths: list) -> dict:
+    pages = sum(count_pdf_pages(path) for path in paths)
+    start = time.perf_counter()
+    result = await processor.process_documents([(path, os.path.basename(path)) for path in paths])
+    wall = time.perf_counter() - start
+
+    files = [r for r in result["files"] if not r.get("error")]
+
+    def stage(name: str) -> float:
+        return sum(r["timings"].get(name, 0.0) for r in files)  # seconds summed over files
+
+    chunks = sum(r["chunks"] for r in files)
+    embedded = sum(r.get("chunks_new", 0) for r in files)
+    return {
+        "documents": len(paths),
+        "failed": len(result["failed"]),
+        "pages": pages,
+        "chunks": chunks,
+        "wall_s": round(wall, 3),
+        "documents_per_s": round(len(paths) / wall, 2),
+        "pages_per_s": round(pages / stage("extract"), 1) if stage("extract") else None,
+        "chunks_per_s": round(chunks / stage("chunk"), 1) if stage("chunk") else None,
+        "embeddings_per_s": round(embedded / stage("embed"), 1) if stage("embed") else None,
+        "end_to_end_chunks_per_s": round(chunks / wall, 1),
+    }
+
+
+async def measure_search(queries: list, limit: int) -> dict:
+    rag = RAGTool()
+    end_to_end = []
+    for query, _ in queries:
+        rag.results_cache.clear()
+        rag.embedding_cache.clear()  # every query pays for its embedding, as a new question would
+        start = time.perf_counter()
+        await rag.search_documents(query, limit)
+        end_to_end.append(time.perf_counter() - start)
+
+    embeddings = embedding_service.encode([query for query, _ in queries])
+    index_only, filtered = [], []
+    for (query, year), embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        vector_index.search(embedding, limit, "exact", query)
+        index_only.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        vector_index.search(embedding, limit, "exact", query, {"fiscal_year": year})
+        filtered.append(time.perf_counter() - start)
+
+    return {
+        "rag_search": percentiles_ms(end_to_end),
+        "index_search": percentiles_ms(index_only),
+        "index_search_filtered": percentiles_ms(filtered),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="documents in each corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--workdir", help="keep the generated PDFs here instead of a temp dir")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingest-benchmark-")
+    database = InMemoryDatabase()
+    processor = DocumentProcessor(InMemoryClient(), database)
+    await vector_index.load(database.document_chunks)  # start from an empty index
+    embedding_service.warmup()  # model load is not part of any measurement
+
+    rng = np.random.default_rng(0)
+    queries = [
+        (f"{rng.choice(SUBJECTS)} {year}", year)
+        for year in rng.integers(2019, 2024, args.queries).tolist()
+    ]
+
+    reports, ingested = [], 0
+    try:
+        start = time.perf_counter()
+        paths = generate_corpus(max(args.sizes), workdir)
+        print(f"Generated {len(paths)} documents in {time.perf_counter() - start:.1f}s")
+
+        for size in sorted(args.sizes):
+            report = {"corpus_documents": size, "ingest": await ingest(processor, paths[ingested:size])}
+            ingested = size
+            report["index_chunks"] = vector_index.count
+            report["search"] = await measure_search(queries, args.limit)
+            reports.append(report)
+            print(json.dumps(report))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "settings": {name: os.getenv(name) for name in SETTINGS},
+                    "model": embedding_service.model_name,
+                    "results": reports,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
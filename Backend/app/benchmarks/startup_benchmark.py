@@ -0,0 +1,122 @@
+"""Import time of `main` and time from process start to the first /health answer.
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+Run from Backend/app (the server needs MONGODB_URL / MONGODB_DBNAME):
+    python -m benchmarks.startup_benchmark --runs 5 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import numpy as np
+
+IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def import_seconds() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_MAIN], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int) -> list:
+    """Packages by cumulative import time (of their slowest-loading entry point,
+    so nested submodules are not counted twice), from `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], capture_output=True, text=True
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            package = match.group(3).split(".")[0]
+            totals[package] = max(totals.get(package, 0), int(match.group(2)))
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def poll(url: str, deadline: float, until_ready: bool) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                body = json.loads(response.read())
+                if not until_ready or body.get("ready"):
+                    return time.perf_counter()
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def serve_once(warmup: str, timeout: float) -> dict:
+    """Seconds from spawning uvicorn to the first /health answer, and to ready: true."""
+    port = free_port()
+    env = {**os.environ, "STARTUP_WARMUP": warmup}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        first_health = poll(url, started + timeout, until_ready=False) - started
+        ready = poll(url, started + timeout, until_ready=True) - started
+        return {"first_health_s": first_health, "ready_s": ready}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summary(values: list) -> dict:
+    return {
+        "median_s": round(float(np.median(values)), 3),
+        "min_s": round(min(values), 3),
+        "max_s": round(max(values), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup-modes", nargs="+", default=["background", "blocking"])
+    parser.add_argument("--timeout", type=float, default=180.0, help="seconds to wait for a server")
+    parser.add_argument("--top", type=int, default=10, help="slowest imported packages to list")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "import_main": summary([import_seconds() for _ in range(args.runs)]),
+        "slowest_imports": slowest_imports(args.top),
+        "startup": {},
+    }
+    for mode in args.warmup_modes:
+        runs = [serve_once(mode, args.timeout) for _ in range(args.runs)]
+        report["startup"][mode] = {
+            "first_health": summary([run["first_health_s"] for run in runs]),
+            "ready": summary([run["ready_s"] for run in runs]),
+        }
+    print(json.dumps(report, indent=2))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
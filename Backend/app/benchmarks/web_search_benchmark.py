@@ -0,0 +1,75 @@
+"""web_search latency with and without the TTL cache / request coalescing,
+against a local fake Tavily backend.
+
+Requests go through ainvoke, the path the async tools take, with up to
+--concurrency of them in flight on one event loop. WEB_SEARCH_BACKEND is set
+to "fake" before tools.Tavily is imported, so no Tavily API key or network
+is needed. Run from Backend/app:
+    python -m benchmarks.web_search_benchmark --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+
+os.environ.setdefault("WEB_SEARCH_BACKEND", "fake")  # importing tools.Tavily must not build a real TavilySearch
+
+from benchmarks.fakes import FakeSearchBackend
+from tools.Tavily import CachedWebSearch
+
+
+async def run(client, queries, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def timed(query):
+        async with slots:
+            start = time.perf_counter()
+            await client.ainvoke({"query": query})
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(query) for query in queries))
+    wall = time.perf_counter() - start
+    return {
+        "wall_s": round(wall, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1),
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20, help="distinct queries among the requests")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake backend latency in seconds")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # popular news gets asked far more often than the rest (Zipf-like)
+    weights = 1 / np.arange(1, args.distinct + 1)
+    picks = rng.choice(args.distinct, args.requests, p=weights / weights.sum())
+    queries = [f"latest news about topic {i}" for i in picks]
+
+    uncached = FakeSearchBackend(args.latency)
+    report = {"uncached": asyncio.run(run(uncached, queries, args.concurrency))}
+    report["uncached"]["backend_calls"] = uncached.calls
+
+    backend = FakeSearchBackend(args.latency)
+    client = CachedWebSearch(backend)
+    report["cached"] = asyncio.run(run(client, queries, args.concurrency))
+    report["cached"].update(client.stats())
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
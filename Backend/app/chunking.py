@@ -0,0 +1,105 @@
+import copy
+import os
+import re
+import threading
+from collections import deque
+from typing import Iterable, Iterator, List, Tuple
+from embeddings import embedding_service
+
+CHUNK_MAX_TOKENS = int(
+    os.getenv("CHUNK_MAX_TOKENS", "0")
+)  # tokens per chunk, 0 = the embedding model's window (256 for all-MiniLM-L6-v2)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))  # tokens repeated from the previous chunk
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WHITESPACE = re.compile(r"\s+")
+SPECIAL_TOKENS = 2  # [CLS] and [SEP] take two positions of the model's window
+
+
+def split_sentences(unit: str) -> List[str]:
+    """Sentences of one page or paragraph. Line breaks inside PDF text are layout,
+    not structure, so all whitespace is collapsed first."""
+    unit = WHITESPACE.sub(" ", unit).strip()
+    return [sentence for sentence in SENTENCE_END.split(unit) if sentence] if unit else []
+
+
+class TokenChunker:
+    """Packs sentences into chunks that fit the embedding model's window.
+
+    Tokens are counted with a private copy of the model's tokenizer, so a
+    chunk is never truncated when it is embedded. Text arrives as an iterable
+    of pages or paragraphs and is processed in one pass: each sentence is
+    tokenized once, and the last sentences of a chunk (up to `overlap_tokens`)
+    start the next.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        service=embedding_service,
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.service = service
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """A copy of the model's tokenizer for this chunker alone. Hugging Face
+        fast tokenizers keep truncation settings on the object, and
+        SentenceTransformer.encode turns truncation on from other threads, so
+        the shared one could cut a long sentence short in the middle of _pieces()."""
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    self._tokenizer = copy.deepcopy(self.service.tokenizer)
+        return self._tokenizer
+
+    @property
+    def budget(self) -> int:
+        window = self.service.max_seq_length - SPECIAL_TOKENS
+        return min(self.max_tokens, window) if self.max_tokens else window
+
+    def _pieces(self, sentences: List[str], budget: int) -> Iterator[Tuple[str, int]]:
+        """(text, token count) per sentence. Sentences longer than the budget, such
+        as flattened tables, are cut at token boundaries into overlap-sized pieces
+        so they still get packed with overlap."""
+        encoded = self.tokenizer(
+            sentences, add_special_tokens=False, return_offsets_mapping=True
+        )  # one batched call per page or paragraph
+        step = min(self.overlap_tokens, budget) or budget
+        for sentence, offsets in zip(sentences, encoded["offset_mapping"]):
+            if not offsets:
+                continue
+            if len(offsets) <= budget:
+                yield sentence, len(offsets)
+                continue
+            for start in range(0, len(offsets), step):
+                window = offsets[start : start + step]
+                yield sentence[window[0][0] : window[-1][1]], len(window)
+
+    def chunks(self, units: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Yield (chunk text, index of the unit the chunk starts in)."""
+        budget = self.budget
+        window = deque()  # (text, tokens, unit index) of the chunk being built
+        tokens = 0
+        for number, unit in enumerate(units):
+            sentences = split_sentences(unit)
+            if not sentences:
+                continue
+            for text, count in self._pieces(sentences, budget):
+                if window and tokens + count > budget:
+                    yield " ".join(piece[0] for piece in window), window[0][2]
+                    while window and (
+                        tokens > self.overlap_tokens or tokens + count > budget
+                    ):  # keep only the tail that fits as overlap
+                        tokens -= window.popleft()[1]
+                window.append((text, count, number))
+                tokens += count
+        if window:
+            yield " ".join(piece[0] for piece in window), window[0][2]
+
+
+token_chunker = TokenChunker()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING
+
+# collection name -> list of (keys, options) for create_index
+INDEXES = {
+    "chat_sessions": [
+        ([("session_id", ASCENDING), ("timestamp", DESCENDING)], {"name": "session_recent"}),
+    ],
+    "document_chunks": [
+        ([("filename", ASCENDING), ("chunk_index", ASCENDING)], {"name": "filename_chunk"}),
+    ],
+    "session_summaries": [
+        ([("session_id", ASCENDING)], {"name": "session_id", "unique": True}),
+    ],
+}
+
+HISTORY_PROJECTION = {"_id": 0, "user_message": 1, "ai_response": 1, "timestamp": 1}
+
+
+async def ensure_indexes(database) -> Dict[str, List[str]]:
+    """Create the indexes the app's queries rely on. create_index is a no-op
+    when an identical index already exists, so this is safe on every startup."""
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = database[collection_name]
+        created[collection_name] = [
+            await collection.create_index(keys, **options) for keys, options in indexes
+        ]
+    return created
+
+
+async def fetch_recent_turns(
+    collection, session_id: str, limit: int, after: Optional[datetime] = None
+) -> List[Dict]:
+    """The latest `limit` turns of a session (newer than `after`, if given),
+    oldest first. Walks the (session_id, timestamp desc) index from the newest
+    entry, so the cost does not depend on how long the session or the
+    collection is."""
+    query = {"session_id": session_id}
+    if after is not None:
+        query["timestamp"] = {"$gt": after}
+    cursor = (
+        collection.find(query, HISTORY_PROJECTION)
+        .sort("timestamp", DESCENDING)
+        .limit(limit)
+    )
+    turns = await cursor.to_list(length=limit)
+    turns.reverse()  # chronological order for the prompt
+    return turns
@@ -0,0 +1,52 @@
+"""Rewrite document_chunks embeddings stored as BSON arrays into packed bytes.
+
+Safe to re-run: only documents whose embedding is still an array are touched.
+Run from Backend/app:
+    python -m database.migrate_embeddings --storage float32
+"""
+
+import argparse
+import asyncio
+import os
+import motor.motor_asyncio
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from embeddings import pack_embedding, unpack_embedding, EMBEDDING_STORAGE
+
+
+async def migrate(collection, storage: str = EMBEDDING_STORAGE, batch_size: int = 500) -> int:
+    cursor = collection.find(
+        {"embedding": {"$type": "array"}}, {"embedding": 1}
+    ).batch_size(batch_size)
+
+    migrated, updates = 0, []
+    async for doc in cursor:
+        updates.append(
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": pack_embedding(unpack_embedding(doc), storage)},
+            )
+        )
+        if len(updates) >= batch_size:
+            migrated += (await collection.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+    if updates:
+        migrated += (await collection.bulk_write(updates, ordered=False)).modified_count
+    return migrated
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", default=EMBEDDING_STORAGE, choices=["float32", "float16", "int8"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+    collection = client[os.getenv("MONGODB_DBNAME")].document_chunks
+    migrated = await migrate(collection, args.storage, args.batch_size)
+    print(f"Packed {migrated} embeddings as {args.storage}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+YEAR = re.compile(r"(?<!\d)(19[89]\d|20\d\d)(?!\d)")
+FISCAL_YEAR = re.compile(
+    r"(?:fiscal\s+(?:year\s+)?(?:ended\s+\w+\s+\d{1,2},?\s+)?|fy\s?'?|annual\s+report\s+(?:for\s+)?)"
+    r"(19[89]\d|20\d\d)",
+    re.IGNORECASE,
+)  # "fiscal year 2022", "fiscal year ended June 30, 2022", "FY2022", "Annual Report 2022"
+CONTENT_SAMPLE = 5000  # characters from the start of a document searched for its year and type
+
+DOCUMENT_TYPES = (  # first match wins, so more specific types come first
+    ("quarterly_report", ("quarterly report", "10-q", "first quarter", "second quarter", "third quarter")),
+    ("annual_report", ("annual report", "10-k")),
+    ("financial_statement", ("balance sheet", "income statement", "cash flow statement", "financial statements")),
+    ("presentation", ("presentation", "investor day", "earnings call")),
+)
+
+FILTER_FIELDS = ("filename", "fiscal_year", "doc_type", "page")  # chunk fields searches can filter on
+
+
+def fiscal_year(filename: str, text: str = "") -> Optional[int]:
+    """Year the document reports on. A year in the filename wins; otherwise an
+    explicit "fiscal year 2022" / "FY2022" near the start of the text, and
+    failing that the year mentioned most often there."""
+    years = YEAR.findall(filename)
+    if years:
+        return int(years[-1])
+    sample = text[:CONTENT_SAMPLE]
+    explicit = FISCAL_YEAR.search(sample)
+    if explicit:
+        return int(explicit.group(1))
+    mentioned = Counter(YEAR.findall(sample))
+    return int(mentioned.most_common(1)[0][0]) if mentioned else None
+
+
+def document_type(filename: str, text: str = "") -> str:
+    for source in (filename.lower().replace("_", " "), text[:CONTENT_SAMPLE].lower()):
+        for doc_type, keywords in DOCUMENT_TYPES:
+            if any(keyword in source for keyword in keywords):
+                return doc_type
+    return "other"
+
+
+def describe_document(filename: str, units: List[str] = ()) -> Dict:
+    """File-level metadata stored on every chunk: fiscal_year and doc_type."""
+    parts, length = [], 0
+    for unit in units:  # only the first pages or paragraphs are needed
+        parts.append(unit)
+        length += len(unit)
+        if length >= CONTENT_SAMPLE:
+            break
+    sample = "\n".join(parts)
+    return {"fiscal_year": fiscal_year(filename, sample), "doc_type": document_type(filename, sample)}
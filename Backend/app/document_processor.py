@@ -1,123 +1,518 @@
+import asyncio
+import hashlib
 import os
+import posixpath
+import time
 import uuid
-from typing import List, Dict
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Callable, Iterable, List, Dict, Optional, Tuple, Union
 from datetime import datetime
-import PyPDF2
-from docx import Document
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from embeddings import encode_texts, pack_embedding, unpack_embedding, EMBED_BATCH_SIZE
+from executors import run_cpu, EXECUTOR_WORKERS
+from chunking import TokenChunker, token_chunker
+from document_metadata import describe_document
+from tools.vector_index import vector_index
+from observability import get_logger, record_span
+
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "500"))  # docs per insert_many() call
+ZIP_MAX_EXTRACTED_BYTES = int(
+    os.getenv("ZIP_MAX_EXTRACTED_BYTES", str(1024 * 1024 * 1024))
+)  # documents unpacked from the archives of one bulk upload, together
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc")
+
+
+log = get_logger(__name__)
+
+
+def _rounded(timings: Dict[str, float]) -> Dict[str, float]:
+    return {stage: round(seconds, 4) for stage, seconds in timings.items()}
+
+
+def _record_stages(timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        record_span(f"process_document.{stage}", seconds)
+
+
+def _error_result(filename: str, error: Exception) -> Dict:
+    log.exception("document_processing_failed", filename=filename)
+    return {"message": f"Error processing document: {str(error)}", "error": str(error)}
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def diff_chunks(existing: List[Dict], chunk_hashes: List[str]):
+    """Match new chunks to stored ones by text hash. Returns (kept, new_indexes,
+    stale): stored docs reused with their new chunk_index, positions of chunks
+    that need embedding, and stored docs whose text is gone."""
+    previous: Dict[str, List[Dict]] = {}
+    for doc in existing:
+        previous.setdefault(
+            doc.get("chunk_hash") or hash_text(doc["text"]), []
+        ).append(doc)  # chunks stored before hashes existed are hashed here
+    kept = []  # (existing doc, its new chunk_index)
+    new_indexes = []
+    for i, chunk_hash in enumerate(chunk_hashes):
+        if previous.get(chunk_hash):
+            kept.append((previous[chunk_hash].pop(), i))
+        else:
+            new_indexes.append(i)
+    stale = [doc for docs in previous.values() for doc in docs]  # changed or removed text
+    return kept, new_indexes, stale
+
+
+def _unchanged_result(filename: str, chunks: int, timings: Dict[str, float]) -> Dict:
+    _record_stages(timings)
+    return {
+        "message": f"Document '{filename}' is unchanged, skipped. Total {chunks} chunks.",
+        "chunks": chunks,
+        "skipped": True,
+        "timings": _rounded(timings),
+    }
+
+
+def expand_zip(
+    zip_path: str, target_dir: str, max_bytes: int = ZIP_MAX_EXTRACTED_BYTES
+) -> List[Tuple[str, str]]:
+    """Write the supported documents in a zip archive to `target_dir` and return
+    their (file_path, filename) pairs. Documents keep their path inside the
+    archive as filename ("2021/report.pdf"), so same-named files in different
+    folders stay apart. Files are named after the member's position, so every
+    archive needs a `target_dir` of its own. Raises ValueError as soon as the unpacked documents pass
+    `max_bytes`, counting the bytes actually written rather than trusting the
+    sizes the archive declares."""
+    files = []
+    budget = max_bytes
+    with zipfile.ZipFile(zip_path) as archive:
+        for number, member in enumerate(archive.infolist()):
+            filename = posixpath.normpath(member.filename.replace("\\", "/")).lstrip("/")
+            basename = posixpath.basename(filename)
+            if (
+                member.is_dir()
+                or filename.startswith(("__MACOSX/", "../"))
+                or basename.startswith(".")
+                or not basename.lower().endswith(SUPPORTED_EXTENSIONS)
+            ):
+                continue
+            if member.file_size > budget:
+                raise ValueError(f"archive unpacks to more than {max_bytes} bytes")
+            file_path = os.path.join(target_dir, f"{number}{os.path.splitext(basename)[1]}")  # never trust member paths
+            with archive.open(member) as source, open(file_path, "xb") as target:  # fail rather than overwrite another archive's file
+                while block := source.read(1 << 20):
+                    budget -= len(block)
+                    if budget < 0:
+                        raise ValueError(f"archive unpacks to more than {max_bytes} bytes")
+                    target.write(block)
+            files.append((file_path, filename))
+    return files
+
+
+def count_pdf_pages(file_path: str) -> int:
+    import PyPDF2  # parsers are imported on first use, not when the server starts
+
+    with open(file_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Text of pages [start, stop). Each worker opens its own reader so page
+    ranges of one PDF can be extracted in parallel."""
+    import PyPDF2
+
+    with open(
+        file_path, "rb"
+    ) as file:  # rb is read binary because pdf files are binary
+        pdf_reader = PyPDF2.PdfReader(
+            file
+        )  # PdfReader is a class in PyPDF2 that reads pdf files
+        return [
+            pdf_reader.pages[i].extract_text() for i in range(start, stop)
+        ]  # extract text from each page in the range
 
 
 class DocumentProcessor:
-    def __init__(self):
-        self.embedding_model = None  # SentenceTransformer("all-MiniLM-L6-v2")
-
-    def _get_embedding_model(self):  # get the embedding model if it is not already loaded. This is a lazy loading technique to avoid loading the model until it is needed.
-        if self.embedding_model is None:
-            self.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-        return self.embedding_model
-
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        text = ""
-        with open(
-            file_path, "rb"
-        ) as file:  # rb is read binary because pdf files are binary
-            pdf_reader = PyPDF2.PdfReader(
-                file
-            )  # PdfReader is a class in PyPDF2 that reads pdf files
-            for page in pdf_reader.pages:  # for each page
-                text += (
-                    page.extract_text() + "\n"
-                )  # extract text from page and add it to the text variable. also add a new line
-
-        return text
-
-    def extract_text_from_docx(self, file_path: str) -> str:
+    def __init__(self, client=None, database=None):
+        """`client` and `database` default to the app's Mongo connection (main.py);
+        benchmarks pass an in-memory stand-in instead."""
+        self._client = client
+        self._database = database
+        self._file_locks: Dict[str, list] = {}  # filename -> [asyncio.Lock, holders and waiters]
+
+    @property
+    def client(self):
+        if self._client is None:
+            from main import client
+
+            return client
+        return self._client
+
+    @property
+    def database(self):
+        if self._database is None:
+            from main import database
+
+            return database
+        return self._database
+
+    def __getstate__(self):
+        return {
+            "_client": None,
+            "_database": None,
+            "_file_locks": {},
+        }  # bound methods go to worker processes, connections and locks stay here
+
+    @asynccontextmanager
+    async def _exclusive(self, filename: str):
+        """Hold the lock of `filename`. Two uploads of the same file would
+        otherwise diff against the same stored chunks and both insert them."""
+        entry = self._file_locks.setdefault(filename, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._file_locks[filename]  # nobody else wants it, don't keep a lock per file ever seen
+
+    async def extract_pages_from_pdf_parallel(self, file_path: str) -> List[str]:
+        """Split the PDF into one page range per executor worker."""
+        page_count = await run_cpu(count_pdf_pages, file_path)
+        per_worker = max(1, -(-page_count // EXECUTOR_WORKERS))  # ceiling division
+        ranges = [
+            (start, min(start + per_worker, page_count))
+            for start in range(0, page_count, per_worker)
+        ]
+        parts = await asyncio.gather(
+            *(run_cpu(extract_pdf_pages, file_path, start, stop) for start, stop in ranges)
+        )  # gather keeps the ranges in page order
+        return [page for part in parts for page in part]
+
+    def extract_paragraphs_from_docx(self, file_path: str) -> List[str]:
+        from docx import Document
+
         doc = Document(file_path)  # document is a class in docx that reads docx files
-        text = ""
-        for paragraph in doc.paragraphs:  # for each paragraph in the document
-            text += (
-                paragraph.text + "\n"
-            )  # add the text from the paragraph to the text variable and add a new line
-        return text  # one big string
-
-    def chunk_text(
-        self, text: str, chunk_size: int = 1000, overlap: int = 200
-    ) -> List[
-        str
-    ]:  # chunking text makes it easier for both sentecetransformers and LLMs to read
-
-        chunks = []
-        start = 0
-
-        while start < len(text):  # slice text from start to end
-            end = start + chunk_size
-            chunk = text[start:end]#slciing text from start to end
-
-            if end < len(text):
-                last_period = chunk.rfind(
-                    "."
-                )  # if not at end of text cut chunk at last period
-                if (
-                    last_period > chunk_size * 0.7
-                ):  # but make sure the chunk is at least 70% of the chunk size
-                    chunk = chunk[: last_period + 1]  # cut at last period
-                    end = start + last_period + 1  # move end to after the last period
-
-            chunks.append(chunk.strip())  # strip the whitespaces and add to chunks list
-            start = end - overlap  # move start to after the last period
-        return [
-            chunk for chunk in chunks if chunk.strip()
-        ]  # remove empty chunks and return the list
+        return [paragraph.text for paragraph in doc.paragraphs]
+
+    def chunk_units(
+        self, text: Union[str, Iterable[str]], chunker: TokenChunker = token_chunker
+    ) -> List[Tuple[str, int]]:  # chunking text makes it easier for both sentecetransformers and LLMs to read
+        """Chunks of at most `chunker.max_tokens` embedding-model tokens, each with the
+        index of the page or paragraph it starts in. `text` is one string or an
+        iterable of pages or paragraphs, consumed in a single pass."""
+        units = [text] if isinstance(text, str) else text
+        return list(chunker.chunks(units))
+
+    async def _replace_chunks(
+        self, collection, new_docs, kept, stale, file_hash: str, chunk_fields: List[Dict]
+    ):
+        """Insert new chunks, renumber the reused ones and delete stale ones in one
+        transaction when the deployment supports it (replica set or sharded).
+        Standalone servers run the same writes in that order, so the file is
+        never without chunks in between."""
+        client = self.client
+
+        async def writes(session):
+            for start in range(0, len(new_docs), INSERT_BATCH_SIZE):
+                await collection.insert_many(
+                    new_docs[start : start + INSERT_BATCH_SIZE], ordered=False, session=session
+                )  # one round trip per write batch
+            if kept:
+                await collection.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": doc["_id"]},
+                            {
+                                "$set": {
+                                    "chunk_index": i,
+                                    **chunk_fields[i],  # page and file metadata may have moved too
+                                    "file_hash": file_hash,
+                                    "chunk_hash": doc.get("chunk_hash") or hash_text(doc["text"]),
+                                }
+                            },
+                        )
+                        for doc, i in kept
+                    ],
+                    ordered=False,
+                    session=session,
+                )
+            if stale:
+                await collection.delete_many(
+                    {"_id": {"$in": [doc["_id"] for doc in stale]}}, session=session
+                )
 
-    async def process_document(self, file_path: str, filename: str) -> str:
         try:
-            if filename.lower().endswith(
-                ".pdf"
-            ):  # make lowercase and check if it ends with pdf
-                text = self.extract_text_from_pdf(
-                    file_path
-                )  # call the extract_text_from_pdf function
-            elif filename.lower().endswith(
-                (".docx", ".doc")
-            ):  # make lowercase and check if it ends with docx or doc
-                text = self.extract_text_from_docx(
-                    file_path
-                )  # call the extract_text_from_docx function
-            else:
-                return f"Unsupported file type: {filename}"
-
-            chunks = self.chunk_text(
-                text
-            )  # call the chunk_text function to chunk the text
-
-            embedding_model = self._get_embedding_model()
-        
-            from main import database
-            collection = database.document_chunks
-
-        
-            saved_chunks = 0
-            for i, chunk in enumerate(chunks):
-                
-                embedding = embedding_model.encode([chunk])[0].tolist()#creating vector representation by passing single chunk as list to embedding model
-            
-                # Save to database
-                doc = {
-                    "filename": filename,
-                    "chunk_index": i,
-                    "text": chunk,
-                    "embedding": embedding,
-                    "timestamp": datetime.utcnow()
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    await writes(session)
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation: transactions need a replica set
+                raise
+            await writes(None)
+
+    async def prepare_document(
+        self, file_path: str, filename: str, progress: Optional[Callable] = None
+    ) -> Dict:
+        """Hash, extract and chunk a file.
+
+        Files whose content hash is already stored under `filename` are skipped.
+        Returns {"result": ...} when there is nothing left to do. Which chunks
+        need embedding is worked out by store_document, under the file's lock."""
+        timings = {}  # seconds spent in each stage, returned with the upload response
+
+        def report(stage: str, **counts):
+            if progress is not None:
+                progress(stage, **counts)
+
+        collection = self.database.document_chunks
+
+        report("hash")
+        started = time.perf_counter()
+        file_hash = await run_cpu(hash_file, file_path)
+        stored = await collection.find(
+            {"filename": filename}, {"_id": 0, "file_hash": 1}
+        ).to_list(length=None)  # early exit only; store_document checks again under the lock
+        timings["hash"] = time.perf_counter() - started
+        if stored and all(doc.get("file_hash") == file_hash for doc in stored):
+            return {"result": _unchanged_result(filename, len(stored), timings)}
+
+        report("extract")
+        started = time.perf_counter()
+        is_pdf = filename.lower().endswith(".pdf")
+        if is_pdf:  # make lowercase and check if it ends with pdf
+            units = await self.extract_pages_from_pdf_parallel(
+                file_path
+            )  # page ranges are extracted on the executor
+        elif filename.lower().endswith(
+            (".docx", ".doc")
+        ):  # make lowercase and check if it ends with docx or doc
+            units = await run_cpu(
+                self.extract_paragraphs_from_docx, file_path
+            )  # python-docx parsing is CPU work too, keep it off the event loop
+        else:
+            return {
+                "result": {
+                    "message": f"Unsupported file type: {filename}",
+                    "error": "unsupported file type",
                 }
-                await collection.insert_one(doc)
-                saved_chunks += 1
-        
+            }
+        timings["extract"] = time.perf_counter() - started
+
+        report("chunk")
+        started = time.perf_counter()
+        chunked = await run_cpu(
+            self.chunk_units, units
+        )  # pages or paragraphs are packed into token-sized chunks in one pass
+        chunks = [chunk for chunk, _ in chunked]
+        chunk_hashes = [hash_text(chunk) for chunk in chunks]
+        file_fields = describe_document(filename, units)  # fiscal_year and doc_type
+        chunk_fields = [
+            {"page": unit + 1 if is_pdf else None, **file_fields} for _, unit in chunked
+        ]  # stored on every chunk so searches can filter on them
+        timings["chunk"] = time.perf_counter() - started
+
+        return {
+            "filename": filename,
+            "file_hash": file_hash,
+            "chunks": chunks,
+            "chunk_hashes": chunk_hashes,
+            "chunk_fields": chunk_fields,
+            "timings": timings,
+        }
 
-            return f"Document '{filename}' saved to database. Total {saved_chunks} chunks."
+    async def store_document(self, prepared: Dict, progress: Optional[Callable] = None) -> Dict:
+        """Embed the new chunks of a prepared document and swap the file's chunk
+        set in Mongo and the search index for the new one. Uploads of the same
+        filename take turns, from reading the stored chunks to the index swap,
+        so each one diffs against what the previous one wrote."""
+        async with self._exclusive(prepared["filename"]):
+            result = await self._store_document(prepared, progress)
+        if vector_index.needs_compaction:
+            await asyncio.to_thread(
+                vector_index.compact
+            )  # builds outside the index lock, searches keep running meanwhile
+        return result
+
+    async def _store_document(self, prepared: Dict, progress: Optional[Callable] = None) -> Dict:
+        filename, file_hash = prepared["filename"], prepared["file_hash"]
+        chunks, chunk_hashes = prepared["chunks"], prepared["chunk_hashes"]
+        chunk_fields = prepared["chunk_fields"]
+        timings = prepared["timings"]
+
+        def report(stage: str, **counts):
+            if progress is not None:
+                progress(stage, **counts)
+
+        collection = self.database.document_chunks
+
+        # reuse chunks whose text is already stored for this file, embed only the rest
+        started = time.perf_counter()
+        existing = await collection.find(
+            {"filename": filename},
+            {"_id": 1, "file_hash": 1, "chunk_hash": 1, "chunk_index": 1, "text": 1},
+        ).to_list(length=None)
+        timings["diff"] = time.perf_counter() - started
+        if existing and all(doc.get("file_hash") == file_hash for doc in existing):
+            return _unchanged_result(filename, len(existing), timings)  # an earlier upload stored it meanwhile
+        kept, new_indexes, stale = diff_chunks(existing, chunk_hashes)
+
+        report("embed", chunks_done=0, chunks_total=len(new_indexes))
+        timings["embed"] = 0.0
+        new_docs = []
+        for batch_start in range(0, len(new_indexes), EMBED_BATCH_SIZE):
+            batch = new_indexes[batch_start : batch_start + EMBED_BATCH_SIZE]
+
+            started = time.perf_counter()
+            embeddings = await run_cpu(
+                encode_texts, [chunks[i] for i in batch]
+            )  # one forward pass per batch, run outside the event loop
+            timings["embed"] += time.perf_counter() - started
+
+            for i, embedding in zip(batch, embeddings):
+                new_docs.append(
+                    {
+                        "filename": filename,
+                        "chunk_index": i,
+                        "text": chunks[i],
+                        **chunk_fields[i],
+                        **pack_embedding(
+                            embedding
+                        ),  # packed bytes, several times smaller than a list of doubles
+                        "file_hash": file_hash,
+                        "chunk_hash": chunk_hashes[i],
+                        "timestamp": datetime.utcnow(),
+                    }
+                )
+            report("embed", chunks_done=len(new_docs))
+
+        report("write")
+        started = time.perf_counter()
+        await self._replace_chunks(
+            collection, new_docs, kept, stale, file_hash, chunk_fields
+        )  # insert_many sets _id on new_docs, which the index keeps
+        vector_index.replace_file(
+            filename,
+            {doc["_id"]: {"chunk_index": i, **chunk_fields[i]} for doc, i in kept},
+            [unpack_embedding(doc) for doc in new_docs],
+            new_docs,
+        )  # same values a restart would load; keep the in-memory search index in step with Mongo
+        timings["write"] = time.perf_counter() - started
+        _record_stages(timings)
+
+        return {
+            "message": f"Document '{filename}' saved to database. Total {len(chunks)} chunks "
+            f"({len(new_docs)} new, {len(kept)} unchanged, {len(stale)} removed).",
+            "chunks": len(chunks),
+            "chunks_new": len(new_docs),
+            "chunks_reused": len(kept),
+            "chunks_removed": len(stale),
+            "timings": _rounded(timings),
+        }
+
+    async def process_document(
+        self, file_path: str, filename: str, progress: Optional[Callable] = None
+    ) -> Dict:
+        """`progress(stage, chunks_done=..., chunks_total=...)` is called as the
+        document moves through hash, extract, chunk, embed and write."""
+        try:
+            prepared = await self.prepare_document(file_path, filename, progress)
+            if "result" in prepared:
+                return prepared["result"]
+            return await self.store_document(prepared, progress)
 
         except Exception as e:
-            return f"Error processing document: {str(e)}"
+            return _error_result(filename, e)
+
+    async def process_documents(
+        self,
+        files: List[Tuple[str, str]],
+        progress: Optional[Callable] = None,
+        file_done: Optional[Callable] = None,
+    ) -> Dict:
+        """Ingest many (file_path, filename) pairs as one pipeline: file k+1 is
+        hashed, extracted and chunked while file k is being embedded and written.
+        `progress` also receives the position of the file the update is about
+        as `file`, and `file_done(position, result)` is called as each file
+        finishes. A filename that already appeared earlier in `files` fails
+        instead of replacing the earlier file's chunks."""
+        prepared_queue: asyncio.Queue = asyncio.Queue(maxsize=1)  # at most one file prepared ahead
+        results: List[Optional[Dict]] = [None] * len(files)
+        started = time.perf_counter()
+
+        def file_progress(position: int):
+            if progress is None:
+                return None
+            return lambda stage, **counts: progress(stage, file=position, **counts)
+
+        async def prepare_all():
+            seen = set()
+            for position, (file_path, filename) in enumerate(files):
+                if filename in seen:
+                    prepared = {
+                        "result": {
+                            "message": f"Skipped '{filename}': another file in this upload has the same name",
+                            "error": "duplicate filename",
+                        }
+                    }
+                else:
+                    seen.add(filename)
+                    try:
+                        prepared = await self.prepare_document(
+                            file_path, filename, file_progress(position)
+                        )
+                    except Exception as e:
+                        prepared = {"result": _error_result(filename, e)}
+                await prepared_queue.put((position, prepared))
+            await prepared_queue.put(None)  # no more files
+
+        producer = asyncio.create_task(prepare_all())
+        try:
+            while (item := await prepared_queue.get()) is not None:
+                position, prepared = item
+                if "result" in prepared:
+                    results[position] = prepared["result"]
+                else:
+                    try:
+                        results[position] = await self.store_document(
+                            prepared, file_progress(position)
+                        )
+                    except Exception as e:
+                        results[position] = _error_result(files[position][1], e)
+                if file_done is not None:
+                    file_done(position, results[position])
+        finally:
+            producer.cancel()  # only matters if storing raised out of the loop
 
+        elapsed = time.perf_counter() - started
+        chunks = sum(r.get("chunks", 0) for r in results if not r.get("error"))
+        embedded = sum(r.get("chunks_new", 0) for r in results)
+        failed = [filename for (_, filename), r in zip(files, results) if r.get("error")]
+        return {
+            "message": f"Processed {len(results)} documents ({len(failed)} failed), "
+            f"{chunks} chunks in {elapsed:.1f}s.",
+            "files": [
+                {"filename": filename, **r} for (_, filename), r in zip(files, results)
+            ],  # in upload order, one entry per file even when names repeat
+            "failed": failed,
+            "chunks": chunks,
+            "chunks_new": embedded,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_second": round(len(results) / elapsed, 3) if elapsed else 0.0,
+            "chunks_per_second": round(embedded / elapsed, 2) if elapsed else 0.0,
+        }
 
 document_processor = DocumentProcessor()
@@ -0,0 +1,138 @@
+import os
+import threading
+from typing import List, Optional
+import numpy as np
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_PRECISION = os.getenv(
+    "EMBEDDING_PRECISION", "float32"
+)  # float32, float16 or int8 (dynamic quantisation of the Linear layers)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # torch intra-op threads, 0 keeps torch's default
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))  # texts per forward pass
+
+EMBEDDING_STORAGE = os.getenv(
+    "EMBEDDING_STORAGE", "float32"
+)  # how document_chunks stores vectors: float32, float16 or int8 (+ scale)
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class EmbeddingService:
+    """The one SentenceTransformer used for both ingestion and queries.
+
+    Documents and queries must be embedded by the same model for their cosine
+    similarity to mean anything, so everything goes through this class. The
+    model is loaded on first use or by warmup() during startup.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        precision: str = EMBEDDING_PRECISION,
+        threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBED_BATCH_SIZE,
+    ):
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+        self.model_name = model_name
+        self.precision = precision
+        self.threads = threads
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()  # two threads must not load the model twice
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.precision == "float16":
+            model = model.half()  # halves memory; CPU speed depends on native fp16 support
+        elif self.precision == "int8":
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )  # int8 weights for the Linear layers, activations quantised on the fly
+        model.eval()
+        return model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
+
+    @property
+    def tokenizer(self):
+        """The model's Hugging Face tokenizer, used to size chunks in its own tokens."""
+        return self.model.tokenizer
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """float32 matrix with one row per text, whatever precision the model runs in."""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def warmup(self):
+        """Load the model and run one tiny batch so the first real request is not the slow one."""
+        self.encode(["warm up"])
+
+
+embedding_service = EmbeddingService()
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Module level so it can be sent to the executor. Worker processes get their
+    own embedding_service, loaded once by the pool initializer."""
+    return embedding_service.encode(texts)
+
+
+def pack_embedding(vector: np.ndarray, storage: str = EMBEDDING_STORAGE) -> dict:
+    """Fields to store an embedding as packed bytes instead of a BSON array of
+    doubles (384 x float64 plus a type tag per element). int8 uses symmetric
+    scalar quantisation: value ~= int8 * embedding_scale."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if storage == "float32":
+        return {"embedding": vector.tobytes(), "embedding_dtype": "float32"}
+    if storage == "float16":
+        return {"embedding": vector.astype(np.float16).tobytes(), "embedding_dtype": "float16"}
+    if storage == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        quantised = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return {
+            "embedding": quantised.tobytes(),
+            "embedding_dtype": "int8",
+            "embedding_scale": scale,
+        }
+    raise ValueError(f"storage must be one of {PRECISIONS}, got {storage!r}")
+
+
+def unpack_embedding(doc: dict) -> np.ndarray:
+    """Embedding of a document_chunks doc as a float32 vector. float32 bytes are
+    wrapped without copying; legacy documents still holding a list also work."""
+    raw = doc["embedding"]
+    if isinstance(raw, list):
+        return np.asarray(raw, dtype=np.float32)
+    dtype = doc.get("embedding_dtype", "float32")
+    vector = np.frombuffer(raw, dtype=dtype)
+    if dtype == "int8":
+        return vector.astype(np.float32) * np.float32(doc["embedding_scale"])
+    if dtype == "float16":
+        return vector.astype(np.float32)
+    return vector
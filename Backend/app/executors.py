@@ -0,0 +1,58 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "thread")  # "thread" or "process"
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[Executor] = None
+
+
+def _init_process_worker():
+    """Runs once in every worker process so each one loads the model a single time."""
+    from embeddings import embedding_service
+
+    embedding_service.warmup()
+
+
+def get_executor() -> Executor:
+    """Pool that CPU-bound work (text extraction, embedding) runs on so it never
+    blocks the event loop. Threads share one model; PyTorch releases the GIL while
+    encoding. Processes also parallelise the pure-Python PDF parsing, at the cost
+    of one model copy per worker."""
+    global _executor
+    if _executor is None:
+        if EXECUTOR_KIND == "process":
+            _executor = ProcessPoolExecutor(
+                max_workers=EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context(
+                    "spawn"
+                ),  # forking a process that already started torch threads can deadlock
+                initializer=_init_process_worker,
+            )
+        elif EXECUTOR_KIND == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=EXECUTOR_WORKERS, thread_name_prefix="cpu-worker"
+            )
+        else:
+            raise ValueError(f"Unknown EXECUTOR_KIND: {EXECUTOR_KIND}")
+    return _executor
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Await `func(*args, **kwargs)` on the executor. With a process pool `func`
+    must be a module-level function and its arguments picklable."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
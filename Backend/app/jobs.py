@@ -0,0 +1,243 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from observability import get_logger
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # documents processed at the same time
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "50"))  # uploads waiting beyond this are rejected
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))  # finished jobs kept for status lookups
+
+log = get_logger(__name__)
+
+
+class IngestionJob:
+    """One upload: a single document, or a batch of documents and zip archives
+    when `bulk` is set."""
+
+    def __init__(self, files: List[Tuple[str, str]], bulk: bool = False):
+        self.id = str(uuid.uuid4())
+        self.files = files  # (temp file path, original filename)
+        self.bulk = bulk
+        self.filename = files[0][1] if not bulk else ", ".join(name for _, name in files)
+        self.stage = "queued"  # queued -> extract -> chunk -> embed -> done | failed
+        self.chunks_done = 0
+        self.chunks_total: Optional[int] = None
+        self._chunks_before = 0  # chunks embedded for earlier files of a bulk job
+        self.files_total = len(files)
+        self.files_done = 0
+        self.file_names: List[str] = []  # documents of a bulk job, zip contents included
+        self.file_stages: List[str] = []  # stage of each of them, by position
+        self.created_at = datetime.utcnow()
+        self.started: Optional[float] = None  # perf_counter values, for throughput
+        self.finished: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    def set_files(self, filenames: List[str]):
+        self.file_names = filenames
+        self.file_stages = ["queued"] * len(filenames)
+        self.files_total = len(filenames)
+
+    def update(
+        self, stage: str, chunks_done: int = None, chunks_total: int = None, file: int = None
+    ):
+        self.stage = stage
+        if file is not None:
+            self.file_stages[file] = stage
+        if chunks_total is not None:  # a file starts embedding; counts add up across files
+            self._chunks_before = self.chunks_done
+            self.chunks_total = (self.chunks_total or 0) + chunks_total
+        if chunks_done is not None:
+            self.chunks_done = self._chunks_before + chunks_done
+
+    def file_done(self, file: int, result: Dict):
+        self.file_stages[file] = "failed" if result.get("error") else "done"
+        self.files_done += 1
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def to_dict(self) -> Dict:
+        elapsed = self.elapsed
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "stage": self.stage,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks_done / elapsed, 2) if elapsed else 0.0,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "files": [
+                {"filename": name, "stage": stage}
+                for name, stage in zip(self.file_names, self.file_stages)
+            ]
+            or None,
+            "created_at": self.created_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestionQueue:
+    """Bounded in-process queue of uploaded files with a fixed set of worker tasks."""
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        max_queued: int = INGEST_QUEUE_SIZE,
+        history: int = INGEST_JOB_HISTORY,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.history = history
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, wait_for: Optional[asyncio.Event] = None):
+        """Accept jobs from now on. Workers hold off until `wait_for` is set, if given."""
+        self._queue = asyncio.Queue(maxsize=self.max_queued)  # created inside the running loop
+        self._ready = wait_for
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingest-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():  # jobs that never started still own their uploads
+            job = self._queue.get_nowait()
+            job.stage, job.error = "failed", "server shut down before processing"
+            self._discard_files(job)
+
+    @staticmethod
+    def _discard_files(job: IngestionJob):
+        for file_path, _ in job.files:
+            try:
+                os.unlink(file_path)  # the upload's temp files belong to the job now
+            except OSError:
+                pass
+
+    def submit(self, file_path: str, filename: str) -> IngestionJob:
+        """Queue a saved upload. Raises asyncio.QueueFull when the backlog is full."""
+        return self._submit(IngestionJob([(file_path, filename)]))
+
+    def submit_bulk(self, files: List[Tuple[str, str]]) -> IngestionJob:
+        """Queue several saved uploads (documents or .zip archives) as one job."""
+        return self._submit(IngestionJob(files, bulk=True))
+
+    def _submit(self, job: IngestionJob) -> IngestionJob:
+        if self._queue is None:
+            raise RuntimeError("ingestion queue has not been started")
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self._forget_old_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        while len(self.jobs) > self.history:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest.stage not in ("done", "failed"):
+                break  # never drop a job that is still queued or running
+            del self.jobs[oldest_id]
+
+    async def _run_bulk(self, job: IngestionJob, extract_dir: str) -> Dict:
+        from document_processor import ZIP_MAX_EXTRACTED_BYTES, document_processor, expand_zip
+        from executors import run_cpu
+
+        files = []
+        budget = ZIP_MAX_EXTRACTED_BYTES  # shared by all archives of the job
+        for file_path, filename in job.files:
+            if filename.lower().endswith(".zip"):
+                archive_dir = tempfile.mkdtemp(dir=extract_dir)  # member names are positions, unique only per archive
+                extracted = await run_cpu(expand_zip, file_path, archive_dir, budget)
+                budget -= sum(os.path.getsize(path) for path, _ in extracted)
+                files.extend(extracted)
+            else:
+                files.append((file_path, filename))
+        job.set_files([filename for _, filename in files])
+        result = await document_processor.process_documents(
+            files, progress=job.update, file_done=job.file_done
+        )
+        if result["failed"] and len(result["failed"]) == len(files):
+            result["error"] = "no document could be processed"
+        return result
+
+    async def _worker(self):
+        from document_processor import document_processor
+
+        if self._ready is not None:
+            await self._ready.wait()
+        while True:
+            job = await self._queue.get()
+            job.started = time.perf_counter()
+            extract_dir = tempfile.mkdtemp(prefix="ingest-") if job.bulk else None
+            try:
+                if job.bulk:
+                    job.result = await self._run_bulk(job, extract_dir)
+                else:
+                    file_path, filename = job.files[0]
+                    job.result = await document_processor.process_document(
+                        file_path, filename, progress=job.update
+                    )
+                    job.files_done = 1
+                job.error = job.result.get("error")
+                job.stage = "failed" if job.error else "done"
+            except Exception as e:
+                log.exception("ingestion_job_failed", job_id=job.id)
+                job.error = str(e)
+                job.stage = "failed"
+            finally:
+                job.finished = time.perf_counter()
+                log.info(
+                    "ingestion_job_finished",
+                    job_id=job.id,
+                    stage=job.stage,
+                    files=job.files_total,
+                    chunks=job.chunks_done,
+                    seconds=round(job.elapsed, 3),
+                )
+                self._discard_files(job)
+                if extract_dir is not None:
+                    shutil.rmtree(extract_dir, ignore_errors=True)
+                self._queue.task_done()
+            if job.stage == "done":
+                await self._update_ann_index()
+
+    @staticmethod
+    async def _update_ann_index():
+        """Train the IVF index once uploads have grown the corpus past its
+        threshold (or doubled it since the last training), without a restart."""
+        from main import ann_index_collection
+        from tools.ann_index import ivf_index
+        from tools.vector_index import vector_index
+
+        trained_size = ivf_index.trained_size
+        try:
+            await ivf_index.load_or_train(ann_index_collection, vector_index)
+        except Exception:
+            log.exception("ivf_index_update_failed")
+            return
+        if ivf_index.trained_size != trained_size:
+            log.info("ivf_index_trained", lists=len(ivf_index.lists), rows=ivf_index.trained_size)
+
+
+ingestion_queue = IngestionQueue()
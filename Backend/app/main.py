@@ -1,9 +1,14 @@
 from fastapi import FastAPI, HTTPException, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi import Request
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 import motor.motor_asyncio
 import uuid
@@ -11,11 +16,50 @@ from datetime import datetime
 from models.chat import ChatRequest, ChatResponse
 from routers.chat import chat_router
 from routers.documents import documentRouter
+from fastapi.responses import Response
+from observability import (
+    REQUEST_SECONDS,
+    TIMING_HEADER,
+    configure_logging,
+    get_logger,
+    metrics_response,
+    server_timing,
+    start_request,
+)
 
 
 load_dotenv()
+configure_logging()
+log = get_logger(__name__)
+
+STARTUP_WARMUP = os.getenv(
+    "STARTUP_WARMUP", "background"
+)  # "background": answer /health at once and warm up behind it; "blocking": warm up before serving; "off": models load on first use
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from jobs import ingestion_queue
+
+    index_loaded = asyncio.Event()
+    ingestion_queue.start(
+        wait_for=index_loaded
+    )  # uploads are accepted at once, processed once the Mongo indexes exist and the index they update is loaded
+    app.state.ready = False
+    warm_up_task = None
+    if STARTUP_WARMUP == "background":
+        warm_up_task = asyncio.create_task(warm_up(index_loaded, models=True))
+    else:
+        await warm_up(index_loaded, models=STARTUP_WARMUP == "blocking")
+    try:
+        yield
+    finally:
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+        await stop_background_work()
 
-app = FastAPI(title="ChatBot")
+
+app = FastAPI(title="ChatBot", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +70,38 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Request latency histogram, and the span breakdown as a Server-Timing
+    header when TIMING_HEADER is on (streaming responses only show the spans
+    that finished before their headers were sent)."""
+    spans = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    seconds = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(seconds)  # route template, not the raw path, keeps the label set small
+    if TIMING_HEADER:
+        response.headers["Server-Timing"] = server_timing(spans + [("total", seconds)])
+    return response
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Answer 413 from the Content-Length header, before any of the body is
+    read. Bodies without a length are cut off as they stream in, by
+    routers.documents.receive_files."""
+    from routers.documents import upload_limit
+
+    limit = upload_limit(request.url.path) if request.method == "POST" else None
+    length = request.headers.get("content-length", "")
+    if limit is not None and length.isdigit() and int(length) > limit:
+        return JSONResponse(status_code=413, content={"detail": "Upload is too large"})
+    return await call_next(request)
+
+
 MONGODB_URL = os.getenv("MONGODB_URL")
 MONGODB_DBNAME = os.getenv("MONGODB_DBNAME")
 
@@ -36,11 +112,111 @@ database = client[MONGODB_DBNAME]
 
 chat_collection = database.chat_sessions
 document_chunks_collection = database.document_chunks
+ann_index_collection = database.ann_indexes
+
+
+async def create_indexes():
+    from database import ensure_indexes
+
+    try:
+        created = await ensure_indexes(database)
+    except Exception:
+        log.exception("mongo_indexes_failed")  # serve anyway, queries just fall back to collection scans
+        return
+    log.info("mongo_indexes_ready", indexes=created)
+
+
+async def warm_up_embedding_model():
+    from embeddings import embedding_service
+
+    await asyncio.to_thread(
+        embedding_service.warmup
+    )  # pay the model load before the first query or upload instead of during it
+    log.info(
+        "embedding_model_ready",
+        model=embedding_service.model_name,
+        precision=embedding_service.precision,
+    )
+
+
+async def load_vector_index():
+    from tools.vector_index import vector_index
+
+    loaded = await vector_index.load(
+        document_chunks_collection
+    )  # read the embeddings once so searches never have to scan the collection
+    log.info("vector_index_loaded", chunks=loaded)
+
+    from tools.ann_index import ivf_index
+
+    if await ivf_index.load_or_train(
+        ann_index_collection, vector_index
+    ):  # centroids live next to document_chunks so restarts skip k-means
+        log.info("ivf_index_ready", lists=len(ivf_index.lists))
+
+
+async def warm_up_agent():
+    def build():
+        from REACT import get_agent  # imports langchain/langgraph and builds the chat model and graph
+
+        get_agent()
+
+    await asyncio.to_thread(build)
+    log.info("agent_ready")
+
+
+async def warm_up(index_loaded: asyncio.Event, models: bool):
+    """Everything the first requests would otherwise wait for. The Mongo indexes
+    are created and the vector index loaded here in every mode; the embedding
+    model and the agent only with `models`."""
+    started = time.perf_counter()
+    try:
+        await create_indexes()
+        await load_vector_index()
+        index_loaded.set()
+        if models:
+            await warm_up_embedding_model()
+            await warm_up_agent()
+        app.state.ready = True
+        log.info("warm_up_done", seconds=round(time.perf_counter() - started, 3))
+    except Exception:
+        index_loaded.set()  # let queued uploads run rather than wait forever
+        log.exception("warm_up_failed")
+
+
+async def stop_background_work():
+    from jobs import ingestion_queue
+    from executors import shutdown_executor
+
+    await ingestion_queue.stop()
+    shutdown_executor()
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "ready": getattr(app.state, "ready", False),
+    }  # "ready" turns true once the index is loaded and models are warm
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_response()  # Prometheus text format
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    from tools.RAG import rag_tool
+    from semantic_cache import semantic_cache
+    from tools.Tavily import web_search_client
+
+    return {
+        "rag": rag_tool.cache_stats(),
+        "semantic": semantic_cache.stats(),
+        "web_search": web_search_client.stats(),
+    }
 
 
 app.include_router(chat_router)
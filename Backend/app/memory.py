@@ -0,0 +1,177 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from pymongo import ASCENDING
+from observability import get_logger, span
+
+log = get_logger(__name__)
+
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))  # tokens of history (summary + turns) per prompt
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "20"))  # most recent turns considered for packing
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "400"))  # length the summary is asked to stay under
+MEMORY_SUMMARY_BATCH = int(os.getenv("MEMORY_SUMMARY_BATCH", "10"))  # oldest overflow turns folded into the summary per update
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a financial "
+    "documents assistant. Update the summary with the new turns below. Keep facts, figures, "
+    "years, company names and open questions; drop pleasantries. Stay under {max_tokens} tokens.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
+)
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens as the OpenAI chat models count them, or a chars/4 estimate
+    when tiktoken is not installed."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o family tokenizer
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def turn_tokens(turn: dict) -> int:
+    return count_tokens(turn["user_message"]) + count_tokens(turn["ai_response"]) + 8  # role/format overhead
+
+
+class ConversationMemory:
+    """Fits a session's history into a fixed token budget.
+
+    The newest turns that fit are sent verbatim. Everything older is folded into
+    a per-session summary kept in `session_summaries`, which is updated in the
+    background after each turn, so prompt size stays bounded however long the
+    session runs. Each update folds at most `summary_batch` turns, so a session
+    with a long backlog catches up over several turns instead of in one
+    oversized summary prompt.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        max_turns: int = MEMORY_MAX_TURNS,
+        summary_max_tokens: int = MEMORY_SUMMARY_MAX_TOKENS,
+        summary_batch: int = MEMORY_SUMMARY_BATCH,
+    ):
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_batch = summary_batch
+        self._summarizing: Set[str] = set()  # sessions with a summary update in flight
+        self._tasks: Set[asyncio.Task] = set()  # keep references so tasks are not garbage collected
+
+    @staticmethod
+    def _collections():
+        from main import chat_collection, database
+
+        return chat_collection, database.session_summaries
+
+    def _pack(self, turns: List[dict], summary_tokens: int) -> int:
+        """Index of the first turn that fits: turns[i:] is the newest suffix within budget."""
+        remaining = self.token_budget - summary_tokens
+        start = len(turns)
+        while start > 0:
+            cost = turn_tokens(turns[start - 1])
+            if cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        return start
+
+    async def load(self, session_id: str) -> Tuple[Optional[str], List[List[str]]]:
+        """(summary or None, [[user_msg, ai_msg], ...]) for the next prompt."""
+        from database import fetch_recent_turns
+
+        chat_collection, summaries = self._collections()
+        summary_doc = await summaries.find_one({"session_id": session_id})
+        summary = summary_doc["summary"] if summary_doc else None
+        covered_until = summary_doc["covered_until"] if summary_doc else None
+
+        turns = await fetch_recent_turns(
+            chat_collection, session_id, self.max_turns, after=covered_until
+        )  # turns already in the summary are not fetched again
+        start = self._pack(turns, count_tokens(summary) if summary else 0)
+        return summary, [[t["user_message"], t["ai_response"]] for t in turns[start:]]
+
+    def schedule_summary_update(self, session_id: str):
+        """Fold turns that no longer fit into the summary, off the request path."""
+        if session_id in self._summarizing:
+            return  # the running update will be followed by another one next turn
+        self._summarizing.add(session_id)
+        task = asyncio.create_task(self.update_summary(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def update_summary(self, session_id: str):
+        from database import HISTORY_PROJECTION, fetch_recent_turns
+
+        try:
+            chat_collection, summaries = self._collections()
+            summary_doc = await summaries.find_one({"session_id": session_id})
+            summary = summary_doc["summary"] if summary_doc else ""
+            covered_until = summary_doc["covered_until"] if summary_doc else None
+
+            recent = await fetch_recent_turns(
+                chat_collection, session_id, self.max_turns, after=covered_until
+            )
+            keep_from = self._pack(recent, count_tokens(summary) if summary else 0)
+            timestamp = {}
+            if covered_until is not None:
+                timestamp["$gt"] = covered_until
+            if keep_from < len(recent):
+                timestamp["$lt"] = recent[keep_from]["timestamp"]  # the turns load() still sends verbatim
+            query = {"session_id": session_id}
+            if timestamp:
+                query["timestamp"] = timestamp
+
+            cursor = (
+                chat_collection.find(query, HISTORY_PROJECTION)
+                .sort("timestamp", ASCENDING)
+                .limit(self.summary_batch)
+            )  # the oldest turns too old to be sent verbatim; any beyond the batch wait for the next update
+            overflow = await cursor.to_list(length=self.summary_batch)
+            if not overflow:
+                return
+
+            summary = await self._summarize(summary, overflow)
+            await summaries.update_one(
+                {"session_id": session_id},
+                {
+                    "$set": {
+                        "summary": summary,
+                        "covered_until": overflow[-1]["timestamp"],
+                        "tokens": count_tokens(summary),
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+                upsert=True,
+            )
+        except Exception:
+            log.exception("summary_update_failed", session_id=session_id)
+        finally:
+            self._summarizing.discard(session_id)
+
+    async def _summarize(self, summary: str, turns: List[dict]) -> str:
+        from REACT import get_llm
+
+        transcript = "\n".join(
+            f"User: {t['user_message']}\nAssistant: {t['ai_response']}" for t in turns
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_tokens=self.summary_max_tokens,
+            summary=summary or "(none yet)",
+            turns=transcript,
+        )
+        with span("memory.summarize"):
+            response = await get_llm().ainvoke([{"role": "user", "content": prompt}])
+        return response.content.strip()
+
+
+conversation_memory = ConversationMemory()
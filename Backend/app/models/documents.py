@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, List, Any
+from datetime import datetime
+
+
+class UploadAccepted(BaseModel):
+    job_id: str
+    status_url: str
+    message: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    filename: str
+    stage: str
+    chunks_done: int
+    chunks_total: Optional[int] = None
+    elapsed_seconds: float
+    chunks_per_second: float
+    files_total: int = 1
+    files_done: int = 0
+    files: Optional[List[Dict[str, str]]] = None  # filename and stage of each file of a bulk upload
+    created_at: datetime
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
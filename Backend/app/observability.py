@@ -0,0 +1,132 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+import structlog
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "console")  # "console" while developing, "json" for log shippers
+TIMING_HEADER = (
+    os.getenv("TIMING_HEADER", "false").lower() == "true"
+)  # add a Server-Timing header with the span breakdown of each request
+
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SPAN_SECONDS = Histogram(
+    "chatbot_span_seconds",
+    "Time spent in an instrumented step (graph node, tool, Mongo call, ingestion stage)",
+    ["span"],
+    buckets=SPAN_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chatbot_http_request_seconds",
+    "Time to produce the response of an HTTP request (headers, for streaming responses)",
+    ["method", "route", "status"],
+    buckets=SPAN_BUCKETS,
+)
+
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_spans", default=None
+)  # spans recorded for the request being served, if any
+
+
+def configure_logging():
+    renderer = (
+        structlog.processors.JSONRenderer()
+        if LOG_FORMAT == "json"
+        else structlog.dev.ConsoleRenderer()
+    )
+    structlog.configure(
+        processors=[
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelName(LOG_LEVEL.upper())
+        ),
+    )
+
+
+def get_logger(name: str):
+    return structlog.get_logger(name)
+
+
+log = get_logger(__name__)
+
+
+def record_span(name: str, seconds: float):
+    """Add a finished measurement to the histogram and to the current request's breakdown."""
+    SPAN_SECONDS.labels(name).observe(seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+class span:
+    """Time a block, as `with span("name"):` or `async with span("name"):`.
+
+    Failures are logged with the span name and re-raised."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        record_span(self.name, seconds)
+        if exc is not None:
+            log.warning("span_failed", span=self.name, seconds=round(seconds, 4), error=str(exc))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def timed(name: str):
+    """Decorator form of span() for coroutine functions."""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_request() -> List[Tuple[str, float]]:
+    """Collect the spans of the current request (and the tasks it starts) from now on."""
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value; repeated spans (tool calls, LLM turns) are summed."""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in spans:
+        total = totals.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+    return ", ".join(
+        f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (seconds, count) in totals.items()
+    )
+
+
+def metrics_response() -> Tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
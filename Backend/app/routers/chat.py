@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from models.chat import ChatRequest, ChatResponse
+import json
 import uuid
 from datetime import datetime
-from openai import OpenAI
 import os
-from REACT import run_react_agent
+from memory import conversation_memory
+from semantic_cache import semantic_cache
+from observability import get_logger, span
+
+log = get_logger(__name__)
 
 chat_router = APIRouter(prefix="/chat", tags=["Chat"])
 
@@ -13,29 +18,16 @@ async def generate_session_id():
     return str(uuid.uuid4())
 
 
-async def get_chat_history(session_id: str, limit: int = 5):
+async def get_chat_history(session_id: str):
+    """(summary of older turns or None, recent turns that fit the token budget)
+    in the format expected by the ReAct agent: [[user_msg, ai_msg], ...]"""
     try:
-        from main import chat_collection
-
-        cursor = (
-            chat_collection.find({"session_id": session_id})
-            .sort("timestamp", 1)  #sort ascending to get chronological order
-            .limit(limit * 2)
-        )
-
-        messages = await cursor.to_list(length=limit * 2)
-
-        #convert to the format expected by ReAct agent: [[user_msg, ai_msg], ...]
-        conversation_history = []
-        for msg in messages:
-            if "user_message" in msg and "ai_response" in msg:
-                conversation_history.append([msg["user_message"], msg["ai_response"]])
+        with span("get_chat_history"):
+            return await conversation_memory.load(session_id)
 
-        return conversation_history
-
-    except Exception as e:
-        print(f"Error getting chat history: {e}")
-        return []
+    except Exception:
+        log.exception("chat_history_failed", session_id=session_id)
+        return None, []
 
 
 async def save_to_database(session_id: str, user_message: str, ai_response: str):
@@ -49,25 +41,38 @@ async def save_to_database(session_id: str, user_message: str, ai_response: str)
             "timestamp": datetime.utcnow(),
         }
 
-        await chat_collection.insert_one(message_doc)
-        print(f"Saved message for session {session_id}")
+        with span("save_to_database"):
+            await chat_collection.insert_one(message_doc)
+        log.debug("message_saved", session_id=session_id)
 
-    except Exception as e:
-        print(f"Error saving to database: {e}")
+    except Exception:
+        log.exception("save_message_failed", session_id=session_id)
 
 
 async def get_ai_response(user_message: str, session_id: str = None) -> str:
     try:
         #get conversation history directly in the correct format
-        conversation_history = []
+        summary, conversation_history = None, []
         if session_id:
-            conversation_history = await get_chat_history(session_id)
-        
+            summary, conversation_history = await get_chat_history(session_id)
+
+        #near-identical question in the same context? answer from the semantic cache
+        cached, embedding = await semantic_cache.lookup(
+            user_message, session_id, conversation_history
+        )
+        if cached is not None:
+            return cached
+
         #use the ReAct agent with conversation history
-        response = await run_react_agent(user_message, conversation_history)
+        from REACT import run_react_agent  # langchain/langgraph load on first use or warm-up, not at import
+
+        response = await run_react_agent(user_message, conversation_history, summary)
+        if not response.startswith("Error running agent"):
+            semantic_cache.store(embedding, response, session_id, conversation_history)
         return response
 
-    except Exception as e:
+    except Exception:
+        log.exception("chat_response_failed", session_id=session_id)
         return f"I'm having trouble right now. You said: '{user_message}'"
 
 
@@ -82,8 +87,60 @@ async def send_message(chat_request: ChatRequest):
         ai_response = await get_ai_response(chat_request.message, session_id)
 
         await save_to_database(session_id, chat_request.message, ai_response)
+        conversation_memory.schedule_summary_update(session_id)
 
         return ChatResponse(response=ai_response, session_id=session_id)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"  # one Server-Sent Event
+
+
+async def _stream_chat(user_message: str, session_id: str):
+    yield _sse("session", {"session_id": session_id})  # lets the client keep the id before the answer lands
+    try:
+        summary, conversation_history = await get_chat_history(session_id)
+
+        cached, embedding = await semantic_cache.lookup(
+            user_message, session_id, conversation_history
+        )
+        if cached is not None:
+            ai_response = cached
+            yield _sse("token", {"content": cached})
+        else:
+            from REACT import stream_react_agent
+
+            ai_response = ""
+            async for event in stream_react_agent(
+                user_message, conversation_history, summary
+            ):
+                if event["type"] == "token":
+                    yield _sse("token", {"content": event["content"]})
+                elif event["type"] == "tool":
+                    yield _sse("tool", event)
+                elif event["type"] == "final":
+                    ai_response = event["content"]
+            semantic_cache.store(embedding, ai_response, session_id, conversation_history)
+
+        await save_to_database(
+            session_id, user_message, ai_response
+        )  # persisted only once the whole answer has been streamed
+        conversation_memory.schedule_summary_update(session_id)
+        yield _sse("done", {"session_id": session_id, "response": ai_response})
+
+    except Exception as e:
+        log.exception("chat_stream_failed", session_id=session_id)
+        yield _sse("error", {"detail": f"Error running agent: {str(e)}"})
+
+
+@chat_router.post("/stream")
+async def stream_message(chat_request: ChatRequest):
+    session_id = chat_request.session_id or await generate_session_id()
+    return StreamingResponse(
+        _stream_chat(chat_request.message, session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # stop proxies buffering the stream
+    )
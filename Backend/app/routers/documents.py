@@ -1,29 +1,240 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, HTTPException, Request
+import asyncio
 import tempfile
-from document_processor import DocumentProcessor
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from jobs import ingestion_queue
+from models.documents import UploadAccepted, JobStatus
 import os
+from typing import Any, Dict, List, Optional, Tuple
 
 
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))  # per uploaded file
+UPLOAD_MAX_BULK_BYTES = int(
+    os.getenv("UPLOAD_MAX_BULK_BYTES", str(1024 * 1024 * 1024))
+)  # all files of one bulk upload together
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # bytes buffered per disk write
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers on top of the file bytes
+
 documentRouter = APIRouter(
     prefix="/documents", tags=["documents"]
 )  # Router for documents separate from the chat router
 
-@documentRouter.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+
+def upload_limit(path: str) -> Optional[int]:
+    """Largest request body accepted on `path`, checked against Content-Length
+    before the body is read (see main.reject_oversized_uploads)."""
+    if path == "/documents/upload":
+        return UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+    if path == "/documents/upload/bulk":
+        return UPLOAD_MAX_BULK_BYTES + MULTIPART_OVERHEAD
+    return None
+
+
+def multipart_body(field: str, many: bool = False) -> Dict:
+    """OpenAPI request body for an endpoint that parses its multipart body itself."""
+    schema: Dict[str, Any] = {"type": "string", "format": "binary"}
+    if many:
+        schema = {"type": "array", "items": schema}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": {field: schema}, "required": [field]}
+                }
+            },
+        }
+    }
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Upload exceeds the {limit // (1024 * 1024)} MB limit"
+    )
+
+
+def discard(paths: List[str]):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+async def receive_files(
+    request: Request, field: str, max_file_bytes: int, max_total_bytes: int
+) -> List[Tuple[str, str]]:
+    """Parse a multipart/form-data body while it streams in and write the files
+    of form field `field` straight to temp files, UPLOAD_CHUNK_SIZE bytes per
+    write. The framework does not spool the body first, so each upload is
+    written to disk once and the limits hold for bodies without a
+    Content-Length too: 413 as soon as one file passes `max_file_bytes` or all
+    of them pass `max_total_bytes`. Returns (path, filename) pairs in upload
+    order; no temp file outlives an error."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    events: List[Tuple[str, Any]] = []  # what the parser found in the current network chunk
+    header = {"field": b"", "value": b"", "disposition": b""}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        if header["field"].lower() == b"content-disposition":
+            header["disposition"] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(header["disposition"])
+        header["disposition"] = b""
+        if options.get(b"name") == field.encode() and b"filename" in options:
+            events.append(("file", options[b"filename"].decode("utf-8", "replace")))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(
+        params[b"boundary"],
+        {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    files: List[Tuple[str, str]] = []
+    target = None  # temp file of the file part being received, None in other parts
+    buffer = bytearray()
+    size = total = received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_total_bytes + MULTIPART_OVERHEAD:
+                raise too_large(max_total_bytes)  # also bounds form fields that are not files
+            parser.write(chunk)
+            for event, value in events:
+                if event == "file":
+                    target = tempfile.NamedTemporaryFile(
+                        delete=False, suffix=os.path.splitext(value)[1]
+                    )
+                    files.append((target.name, value))
+                    size = 0
+                elif event == "data" and target is not None:
+                    size += len(value)
+                    total += len(value)
+                    if size > max_file_bytes:
+                        raise too_large(max_file_bytes)
+                    if total > max_total_bytes:
+                        raise too_large(max_total_bytes)
+                    buffer += value
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        await asyncio.to_thread(target.write, buffer)  # disk writes stay off the event loop
+                        buffer.clear()
+                elif event == "end" and target is not None:
+                    await asyncio.to_thread(target.write, buffer)
+                    buffer.clear()
+                    target.close()
+                    target = None
+            events.clear()
+        parser.finalize()
+        if target is not None:
+            raise HTTPException(status_code=400, detail="Upload ended in the middle of a file")
+        if not files:
+            raise HTTPException(status_code=422, detail=f"No file in form field '{field}'")
+    except BaseException as e:
+        if target is not None:
+            target.close()
+        discard([path for path, _ in files])
+        if isinstance(e, MultipartParseError):
+            raise HTTPException(status_code=400, detail="Malformed multipart body")
+        raise
+    return files
+
+
+@documentRouter.post(
+    "/upload", response_model=UploadAccepted, status_code=202, openapi_extra=multipart_body("file")
+)
+async def upload_document(request: Request):
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        # Process the document
-        from document_processor import document_processor
-        result = await document_processor.process_document(tmp_file_path, file.filename)        
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
-        
-        return {"message": result}
-        
+        saved = await receive_files(request, "file", UPLOAD_MAX_BYTES, UPLOAD_MAX_BYTES)
+    except HTTPException:
+        raise
     except Exception as e:
-        return {"error": f"Upload failed: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    if len(saved) > 1:
+        discard([tmp_file_path for tmp_file_path, _ in saved])
+        raise HTTPException(status_code=400, detail="Send one file, or use /documents/upload/bulk")
+    tmp_file_path, filename = saved[0]
+
+    try:
+        job = ingestion_queue.submit(
+            tmp_file_path, filename
+        )  # processed in the background; the worker removes the temp file
+    except BaseException as e:
+        discard([tmp_file_path])
+        if isinstance(e, asyncio.QueueFull):
+            raise HTTPException(
+                status_code=503, detail="Too many documents are being processed, try again shortly"
+            )
+        raise
+
+    return UploadAccepted(
+        job_id=job.id,
+        status_url=f"/documents/jobs/{job.id}",
+        message=f"Document '{filename}' queued for processing",
+    )
+
+
+@documentRouter.post(
+    "/upload/bulk",
+    response_model=UploadAccepted,
+    status_code=202,
+    openapi_extra=multipart_body("files", many=True),
+)
+async def upload_documents(request: Request):
+    """Several documents and/or .zip archives of documents, ingested as one job.
+    Extraction of the next file overlaps embedding of the current one."""
+    try:
+        saved = await receive_files(
+            request, "files", UPLOAD_MAX_BYTES, UPLOAD_MAX_BULK_BYTES
+        )  # per-file limit, and the batch limit over all of them
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+    try:
+        job = ingestion_queue.submit_bulk(saved)
+    except BaseException as e:
+        discard([tmp_file_path for tmp_file_path, _ in saved])
+        if isinstance(e, asyncio.QueueFull):
+            raise HTTPException(
+                status_code=503, detail="Too many documents are being processed, try again shortly"
+            )
+        raise
+
+    return UploadAccepted(
+        job_id=job.id,
+        status_url=f"/documents/jobs/{job.id}",
+        message=f"{len(saved)} files queued for processing",
+    )
+
+
+@documentRouter.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
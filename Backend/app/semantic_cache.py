@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from embeddings import embedding_service
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # cosine similarity needed for a hit
+SEMANTIC_CACHE_SCOPE = os.getenv("SEMANTIC_CACHE_SCOPE", "session")  # "session" or "global"
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_HISTORY_TURNS = int(
+    os.getenv("SEMANTIC_CACHE_HISTORY_TURNS", "1")
+)  # recent turns that must match too, since follow-ups depend on them
+
+
+class SemanticCache:
+    """Answers keyed by the meaning of a message rather than its exact text.
+
+    Entries are grouped into buckets of (scope, history hash) so a message is
+    only compared with earlier messages asked in the same context. Inside a
+    bucket the best cosine similarity above `threshold` is a hit.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        scope: str = SEMANTIC_CACHE_SCOPE,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        history_turns: int = SEMANTIC_CACHE_HISTORY_TURNS,
+    ):
+        if scope not in ("session", "global"):
+            raise ValueError(f"scope must be 'session' or 'global', got {scope!r}")
+        self.enabled = enabled
+        self.threshold = threshold
+        self.scope = scope
+        self.maxsize = maxsize
+        self.history_turns = history_turns
+        self.hits = 0
+        self.misses = 0
+        self._ids = itertools.count()
+        self._lru: "OrderedDict[int, tuple]" = OrderedDict()  # entry id -> bucket, oldest first
+        self._buckets: Dict[tuple, Dict[int, Tuple[np.ndarray, str]]] = {}
+        self._lock = threading.RLock()  # clear() is also called while lookup/store hold it
+        self._documents_version = None
+
+    def _bucket(self, session_id: Optional[str], history: Optional[List]) -> tuple:
+        recent = (history or [])[-self.history_turns :] if self.history_turns else []
+        history_hash = hashlib.sha1(
+            json.dumps(recent, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        owner = session_id if self.scope == "session" else "global"
+        return owner, history_hash
+
+    def _check_documents(self):
+        """Answers may quote documents, so any change to the index drops them all."""
+        from tools.vector_index import vector_index
+
+        if self._documents_version != vector_index.version:
+            self.clear()
+            self._documents_version = vector_index.version
+
+    async def lookup(
+        self, message: str, session_id: Optional[str], history: Optional[List]
+    ) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """Return (answer or None, message embedding). Pass the embedding on to
+        store() so a miss does not encode the message twice."""
+        if not self.enabled:
+            return None, None
+
+        embedding = (await asyncio.to_thread(embedding_service.encode, [message]))[0]
+        embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+
+        with self._lock:
+            self._check_documents()
+            bucket = self._buckets.get(self._bucket(session_id, history))
+            if bucket:
+                ids = list(bucket)
+                scores = np.stack([bucket[i][0] for i in ids]) @ embedding
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    self._lru.move_to_end(ids[best])
+                    self.hits += 1
+                    return bucket[ids[best]][1], embedding
+            self.misses += 1
+        return None, embedding
+
+    def store(
+        self,
+        embedding: Optional[np.ndarray],
+        answer: str,
+        session_id: Optional[str],
+        history: Optional[List],
+    ):
+        if not self.enabled or embedding is None:
+            return
+        key = self._bucket(session_id, history)
+        with self._lock:
+            self._check_documents()
+            entry_id = next(self._ids)
+            self._buckets.setdefault(key, {})[entry_id] = (embedding, answer)
+            self._lru[entry_id] = key
+            while len(self._lru) > self.maxsize:
+                old_id, old_key = self._lru.popitem(last=False)  # least recently used
+                old_bucket = self._buckets[old_key]
+                del old_bucket[old_id]
+                if not old_bucket:
+                    del self._buckets[old_key]
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scope": self.scope,
+            "threshold": self.threshold,
+            "size": len(self._lru),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+semantic_cache = SemanticCache()
@@ -1,64 +1,81 @@
+import asyncio
 import os
-from typing import List, Dict
-import numpy as np
-from sentence_transformers import SentenceTransformer
+from typing import Any, List, Dict, Optional
+from cache import LRUCache, normalize_query
+from embeddings import embedding_service
+from observability import get_logger, span
+from tools.vector_index import vector_index
+
+RAG_SEARCH_MODE = os.getenv(
+    "RAG_SEARCH_MODE", "ivf"
+)  # "ivf" for approximate search, "exact" to always score every chunk
+RAG_HYBRID = (
+    os.getenv("RAG_HYBRID", "true").lower() == "true"
+)  # fuse BM25 keyword matches with vector results
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "1024"))  # entries in each cache
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "600"))  # seconds
+
+log = get_logger(__name__)
 
 
 class RAGTool:
     def __init__(self):
         self.name = "RAGTool"
         self.description = "Retrieve, augment and generate"
-        self.embeddingModel = SentenceTransformer(
-            "all-Mini-L6-v2"
-        )  # Secret sauce that creates the vector embeddings for the documents
-
-    async def search_documents(self, query: str, limit: int = 5):
+        self.embeddingModel = embedding_service  # Secret sauce that creates the vector embeddings, shared with ingestion so queries and chunks live in the same space
+        self.embedding_cache = LRUCache(RAG_CACHE_SIZE, RAG_CACHE_TTL)  # query -> embedding
+        self.results_cache = LRUCache(RAG_CACHE_SIZE, RAG_CACHE_TTL)  # (query, limit, mode, hybrid, filters) -> top-k
+        self._results_version = vector_index.version  # index version the cached results belong to
+
+    async def search_documents(
+        self,
+        query: str,
+        limit: int = 5,
+        mode: str = RAG_SEARCH_MODE,
+        hybrid: bool = RAG_HYBRID,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """`filters` such as {"fiscal_year": 2022, "filename": "netsol"} limit the
+        search to matching chunks (see VectorIndex.rows_matching)."""
         try:
-            queryEmbedding = self.embeddingModel.encode([query])[
-                0
-            ]  # uses the sauce to create the vector embedding for the query
-
-            from main import database
-
-            collection = database.document_chunks  # Fixed collection name
-
-            cursor = collection.find({})
-            documents = await cursor.to_list(length=None)
-
-            results = []
-            for doc in documents:
-                if "embedding" in doc:
-                    similarity = self._cosine_similarity(
-                        queryEmbedding, doc["embedding"]
-                    )
-
-                    results.append(
-                        {
-                            "text": doc["text"],
-                            "filename": doc["filename"],
-                            "similarity": similarity,
-                            "chunk_index": doc["chunk_index"],
-                        }
-                    )
-
-            results.sort(key=lambda x: x["similarity"], reverse=True)
-            return results[:limit]
-
-        except Exception as e:
-            print(f"Error searching documents: {e}")
+            key = normalize_query(query)
+            filters = {field: value for field, value in (filters or {}).items() if value is not None}
+            result_key = (key, limit, mode, hybrid, repr(sorted(filters.items())))
+            if self._results_version != vector_index.version:
+                self.results_cache.clear()  # document_chunks changed, cached top-k may be wrong
+                self._results_version = vector_index.version
+            results = self.results_cache.get(result_key)
+            if results is not None:
+                return results
+
+            queryEmbedding = self.embedding_cache.get(key)
+            if queryEmbedding is None:
+                with span("rag.embed_query"):
+                    queryEmbedding = (
+                        await asyncio.to_thread(self.embeddingModel.encode, [query])
+                    )[
+                        0
+                    ]  # uses the sauce to create the vector embedding for the query, off the event loop
+                self.embedding_cache.put(key, queryEmbedding)
+
+            version = vector_index.version
+            with span("rag.index_search"):
+                results = vector_index.search(
+                    queryEmbedding, limit, mode, query if hybrid else None, filters
+                )  # one call over the resident index instead of scanning Mongo; falls back to exact until the ANN index is trained
+            if version == vector_index.version:  # don't cache results raced by an ingestion
+                self.results_cache.put(result_key, results)
+            return results
+
+        except Exception:
+            log.exception("rag_search_failed", query=query)
             return []
 
-    def _cosine_similarity(self, a, b):
-        a = np.array(a)  # converting the vecotr into a numpy array
-        b = np.array(b)
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-        """calculating the cosine similarity by taking the dot product of 
-    the two vector numpy arrays and dividing it by the product of 
-    the norms(magnitude) of the two vectors. The formula for cosine 
-    similarity is (A.B) / (||A|| * ||B||). This gives us 3 values, 0, 1, and -1. 
-    1 means they have the same direction so same semantic meaning, 0 means they are perpendicular
-    so no similarity, and -1 means they have opposite directions so opposite semantic meaning."""
-
+    def cache_stats(self) -> Dict:
+        return {
+            "query_embeddings": self.embedding_cache.stats(),
+            "results": self.results_cache.stats(),
+        }
 
     def format_results(self, results: List[Dict]) -> str:
         if not results:
@@ -66,7 +83,10 @@ class RAGTool:
 
         formatted = "Relevant document information:\n"
         for i, result in enumerate(results, 1):
-            formatted += f"{i}. From {result['filename']} (similarity: {result['similarity']:.2f}):\n"
+            source = result["filename"]
+            if result.get("page"):
+                source += f", page {result['page']}"
+            formatted += f"{i}. From {source} (similarity: {result['similarity']:.2f}):\n"
             formatted += f"   {result['text'][:300]}...\n\n"
 
         return formatted
@@ -1,9 +1,92 @@
-from langchain_tavily import TavilySearch
-
-# Initialize the official Tavily Search tool
-tavily_tool = TavilySearch(
-    max_results=5,
-    topic="general",
-    include_answer=True,
-    search_depth="basic"
-)
+import asyncio
+import os
+from typing import Dict
+from cache import LRUCache, normalize_query
+
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "300"))  # seconds; news goes stale quickly
+WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512"))
+
+WEB_SEARCH_BACKEND = os.getenv(
+    "WEB_SEARCH_BACKEND", "tavily"
+)  # "fake" answers locally after FAKE_SEARCH_LATENCY seconds, for load tests
+FAKE_SEARCH_LATENCY = float(os.getenv("FAKE_SEARCH_LATENCY", "1.5"))
+
+if WEB_SEARCH_BACKEND == "fake":
+    from benchmarks.fakes import FakeSearchBackend
+
+    tavily_tool = FakeSearchBackend(latency=FAKE_SEARCH_LATENCY)
+else:
+    from langchain_tavily import TavilySearch
+
+    # Initialize the official Tavily Search tool
+    tavily_tool = TavilySearch(
+        max_results=5,
+        topic="general",
+        include_answer=True,
+        search_depth="basic"
+    )
+
+
+class CachedWebSearch:
+    """TTL cache and request coalescing in front of a search backend.
+
+    `backend` is anything with Tavily's `ainvoke({"query": ..., **params})`, so a
+    local fake can stand in for it. Identical searches that arrive while one is
+    already running wait for that call instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        backend,
+        ttl: float = WEB_SEARCH_CACHE_TTL,
+        maxsize: int = WEB_SEARCH_CACHE_SIZE,
+    ):
+        self.backend = backend
+        self.cache = LRUCache(maxsize, ttl)
+        self.backend_calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(payload: dict) -> tuple:
+        params = tuple(sorted((k, repr(v)) for k, v in payload.items() if k != "query"))
+        return normalize_query(payload["query"]), params
+
+    async def ainvoke(self, payload: dict) -> dict:
+        """Cached result, or the result of the backend call for this search. The
+        call runs in its own task that every caller awaits through a shield, so a
+        caller that is cancelled (tool timeout, client gone) leaves the call
+        running for the others and for the cache."""
+        key = self._key(payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:  # no lock needed, this all runs on the event loop thread
+            self.coalesced += 1
+        else:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, payload))
+            task.add_done_callback(
+                lambda done: done.cancelled() or done.exception()
+            )  # mark the error retrieved in case every caller was cancelled
+            self.backend_calls += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: tuple, payload: dict) -> dict:
+        try:
+            result = await self.backend.ainvoke(payload)
+            self.cache.put(key, result)  # errors are raised, never cached
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            "backend_calls": self.backend_calls,
+            "coalesced": self.coalesced,
+        }
+
+
+web_search_client = CachedWebSearch(tavily_tool)
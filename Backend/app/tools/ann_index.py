@@ -0,0 +1,214 @@
+import asyncio
+import math
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from executors import run_cpu
+
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # 0 means pick sqrt(N) lists when training
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_MIN_TRAIN_SIZE = int(os.getenv("ANN_MIN_TRAIN_SIZE", "10000"))  # below this exact search is fast enough
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first, without sorting everything."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]  # unordered top k in O(N)
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]  # only sort the k winners
+
+
+def kmeans(sample: np.ndarray, nlist: int, iters: int, seed: int) -> np.ndarray:
+    """Spherical k-means centroids of `sample`. Module level so run_cpu can
+    send it to a worker process."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assignments = (sample @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():  # re-seed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)  # spherical k-means keeps centroids unit length
+    return centroids
+
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+    """Nearest centroid for every vector, in blocks to bound the score matrix."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = vectors[start : start + block] @ centroids.T
+        assignments[start : start + block] = scores.argmax(axis=1)
+    return assignments
+
+
+def assign_lists(matrix: np.ndarray, centroids: np.ndarray) -> List[np.ndarray]:
+    """Row ids of `matrix` grouped by nearest centroid, one array per cluster."""
+    assignments = nearest_centroid(matrix, centroids)
+    order = np.argsort(assignments, kind="stable")
+    bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+    return [order[bounds[c] : bounds[c + 1]].astype(np.int64) for c in range(len(centroids))]
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of a VectorIndex matrix.
+
+    Spherical k-means splits the (unit length) vectors into `nlist` clusters.
+    A query is compared against the centroids first and only the rows of the
+    `nprobe` closest clusters are scored, so each search touches roughly
+    nprobe / nlist of the corpus instead of all of it.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        nlist: int = ANN_NLIST,
+        nprobe: int = ANN_NPROBE,
+        min_train_size: int = ANN_MIN_TRAIN_SIZE,
+        kmeans_iters: int = 10,
+        sample_per_list: int = 32,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iters = kmeans_iters
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []  # row ids of the VectorIndex matrix, one array per cluster
+        self.trained_size = 0
+        self._updating = asyncio.Lock()  # one load_or_train at a time
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _sample(self, matrix: np.ndarray) -> Tuple[np.ndarray, int]:
+        """(k-means training sample, nlist) for `matrix`."""
+        n = len(matrix)
+        nlist = self.nlist or max(1, int(math.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, nlist * self.sample_per_list)
+        return matrix[rng.choice(n, sample_size, replace=False)], nlist
+
+    def install(self, centroids: np.ndarray, lists: List[np.ndarray], trained_size: int):
+        """Switch to new centroids and cluster lists in one step."""
+        with self._lock:
+            self.centroids = centroids.astype(np.float32)
+            self.lists = lists
+            self.trained_size = trained_size
+
+    def train(self, matrix: np.ndarray):
+        """Run k-means on a sample of the rows and assign every row to a cluster."""
+        sample, nlist = self._sample(matrix)
+        centroids = kmeans(sample, nlist, self.kmeans_iters, self.seed)
+        self.install(centroids, assign_lists(matrix, centroids), len(matrix))
+
+    def attach(self, centroids: np.ndarray, matrix: np.ndarray, trained_size: int):
+        """Reuse persisted centroids; only the row assignments are recomputed."""
+        self.install(centroids, assign_lists(matrix, centroids), trained_size)
+
+    def remove(self, rows: np.ndarray):
+        """Take deleted rows out of their clusters."""
+        with self._lock:
+            if not self.is_trained or len(rows) == 0:
+                return
+            self.lists = [members[~np.isin(members, rows)] for members in self.lists]
+
+    def renumber(self, remap: np.ndarray):
+        """Follow a compaction of the matrix: row r becomes remap[r]."""
+        with self._lock:
+            self.lists = [remap[members] for members in self.lists]
+
+    def add(self, vectors: np.ndarray, start_row: int):
+        """Route freshly appended rows to their nearest cluster."""
+        with self._lock:
+            if not self.is_trained or len(vectors) == 0:
+                return
+            assignments = nearest_centroid(vectors, self.centroids)
+            for c in np.unique(assignments):
+                rows = np.flatnonzero(assignments == c) + start_row
+                self.lists[c] = np.concatenate([self.lists[c], rows])
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, scores) of the best k rows among the probed clusters."""
+        with self._lock:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            probed = top_k(self.centroids @ query, nprobe)
+            candidates = np.concatenate([self.lists[c] for c in probed])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = matrix[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def to_document(self) -> dict:
+        return {
+            "_id": self.name,
+            "dim": int(self.centroids.shape[1]),
+            "nlist": int(self.centroids.shape[0]),
+            "centroids": self.centroids.astype(np.float32).tobytes(),
+            "trained_size": self.trained_size,
+            "timestamp": datetime.utcnow(),
+        }
+
+    async def load_or_train(self, collection, vector_index) -> bool:
+        """Attach to centroids saved in `collection`, (re)training when there are none,
+        they do not fit the current embeddings, or the corpus has doubled since.
+        Called at startup and after every ingestion job, so a corpus that grows
+        past min_train_size through uploads switches to IVF without a restart.
+        k-means runs on the executor and the row assignment in a thread, so the
+        event loop keeps serving meanwhile. Returns whether the backend is usable."""
+        if self._updating.locked():
+            return self.is_trained  # another caller is already on it
+        async with self._updating:
+            matrix, generation = vector_index.snapshot()
+            n = len(matrix)
+            if n < self.min_train_size:
+                return self.is_trained  # exact search covers small corpora
+            if self.is_trained and n < 2 * self.trained_size:
+                return True
+
+            saved = await collection.find_one({"_id": self.name})
+            if (
+                saved
+                and saved["dim"] == vector_index.dim
+                and n < 2 * saved["trained_size"]
+            ):
+                centroids = np.frombuffer(saved["centroids"], dtype=np.float32).reshape(
+                    saved["nlist"], saved["dim"]
+                )
+                trained_size = saved["trained_size"]
+            else:
+                sample, nlist = self._sample(matrix)
+                centroids = await run_cpu(kmeans, sample, nlist, self.kmeans_iters, self.seed)
+                trained_size, saved = n, None
+            lists = await asyncio.to_thread(assign_lists, matrix, centroids)
+            if not vector_index.register_backend(
+                self, n, (centroids, lists, trained_size), generation
+            ):
+                return self.is_trained  # compacted meanwhile, row ids moved; the next call retries
+            if saved is None:
+                await collection.replace_one(
+                    {"_id": self.name}, self.to_document(), upsert=True
+                )
+            return True
+
+
+ivf_index = IVFIndex()
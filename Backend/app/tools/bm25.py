@@ -0,0 +1,166 @@
+import math
+import re
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from tools.ann_index import top_k
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")  # keeps "2021", "12.5", "1,200" and "ebitda" whole
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring over chunk text.
+
+    Rows use the same ids as the VectorIndex matrix, so lexical and vector
+    results can be fused directly. Postings are appended as chunks arrive and
+    turned into NumPy arrays lazily, the first time a term is searched after
+    it changed. Removed rows keep their postings until the owner compacts the
+    index, but score zero and no longer count towards document frequencies
+    or the average length.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = 0
+        self.total_length = 0
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}  # term -> (rows, term frequencies), arrays after compaction
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # frozen copies of _postings
+        self._lengths_array = np.zeros(0, dtype=np.float32)
+        self._removed: Set[int] = set()
+        self._removed_array: Optional[np.ndarray] = None
+        self._removed_df: Dict[str, int] = {}  # term -> removed rows that contain it
+
+    def add(self, texts: List[str], start_row: int):
+        for row, text in enumerate(texts, start_row):
+            counts: Dict[str, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                rows, tfs = self._postings.setdefault(term, ([], []))
+                if isinstance(rows, np.ndarray):  # left frozen by compacted()
+                    rows, tfs = self._postings[term] = (rows.tolist(), tfs.tolist())
+                rows.append(row)
+                tfs.append(tf)
+                self._arrays.pop(term, None)
+            self._lengths.append(len(tokens))
+            self.total_length += len(tokens)
+        self.size += len(texts)
+
+    def remove(self, rows: np.ndarray, texts: List[str]):
+        """Stop scoring `rows`, whose texts are given so only they are tokenized again."""
+        for row, text in zip(rows.tolist(), texts):
+            if row in self._removed:
+                continue
+            self._removed.add(row)
+            for term in set(tokenize(text)):
+                self._removed_df[term] = self._removed_df.get(term, 0) + 1
+            self.total_length -= self._lengths[row]
+        self._removed_array = None
+
+    def snapshot(self) -> Dict[str, int]:
+        """Length of every posting list, taken under the owner's lock so
+        compacted() can read the lists while rows keep being appended."""
+        return {term: len(rows) for term, (rows, _) in self._postings.items()}
+
+    def compacted(self, snapshot: Dict[str, int], remap: np.ndarray) -> "BM25Index":
+        """New index over the rows that `remap` (old row -> new row, -1 for
+        removed) keeps, as of `snapshot`. Postings are renumbered, so no text
+        is tokenized again, and kept as the arrays searches use."""
+        index = BM25Index(self.k1, self.b)
+        keep = remap >= 0
+        lengths = np.asarray(self._lengths[: len(remap)], dtype=np.int64)[keep]
+        index._lengths = lengths.tolist()
+        index.total_length = int(lengths.sum())
+        index.size = len(index._lengths)
+        for term, count in snapshot.items():
+            rows, tfs = self._postings[term]
+            rows = remap[np.asarray(rows[:count], dtype=np.int64)]
+            kept = rows >= 0
+            rows = rows[kept]
+            if len(rows):
+                index._postings[term] = index._arrays[term] = (
+                    rows,
+                    np.asarray(tfs[:count], dtype=np.float32)[kept],
+                )
+        return index
+
+    def release(self):
+        """Free the postings one term at a time, so the thread dropping a large
+        index lets other threads run in between."""
+        self._arrays.clear()
+        while self._postings:
+            self._postings.popitem()
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, tfs = self._postings[term]
+            arrays = self._arrays[term] = (
+                np.asarray(rows, dtype=np.int64),
+                np.asarray(tfs, dtype=np.float32),
+            )
+        return arrays
+
+    def scores(self, query: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """BM25 score of every row for `query` (zero where no term matches), or
+        of each of `rows` (sorted) when given. Then only the postings that fall
+        inside `rows` are scored, so the cost follows the subset and the query
+        terms' postings rather than the size of the corpus."""
+        if len(self._lengths_array) != self.size:
+            self._lengths_array = np.asarray(self._lengths, dtype=np.float32)
+        scores = np.zeros(self.size if rows is None else len(rows), dtype=np.float32)
+        documents = self.size - len(self._removed)
+        if documents == 0 or len(scores) == 0:
+            return scores
+        average_length = self.total_length / documents or 1.0
+
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            term_rows, tfs = self._term_arrays(term)
+            frequency = len(term_rows) - self._removed_df.get(term, 0)
+            idf = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+            if rows is None:
+                targets = term_rows
+            else:
+                targets = np.minimum(np.searchsorted(rows, term_rows), len(rows) - 1)
+                inside = rows[targets] == term_rows  # postings of rows in the subset
+                targets, term_rows, tfs = targets[inside], term_rows[inside], tfs[inside]
+            norm = self.k1 * (1 - self.b + self.b * self._lengths_array[term_rows] / average_length)
+            scores[targets] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        if self._removed:
+            if self._removed_array is None:
+                self._removed_array = np.fromiter(self._removed, dtype=np.int64)
+            if rows is None:
+                scores[self._removed_array] = 0.0
+            else:
+                scores[np.isin(rows, self._removed_array)] = 0.0
+        return scores
+
+    def search(
+        self, query: str, k: int, rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the best k rows that match at least one query term,
+        only among `rows` (sorted) when given."""
+        scores = self.scores(query, rows)
+        best = top_k(scores, k)
+        best = best[scores[best] > 0]
+        if rows is not None:
+            return rows[best], scores[best]
+        return best, scores[best]
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int = 60) -> List[int]:
+    """Merge ranked row lists: each row scores sum(1 / (k + rank)). Rank based, so
+    the very different BM25 and cosine scales need no calibration."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist(), 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
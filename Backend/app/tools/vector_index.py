@@ -0,0 +1,412 @@
+import threading
+import os
+from typing import Any, List, Dict, Optional, Set, Tuple
+import numpy as np
+from document_metadata import FILTER_FIELDS, describe_document
+from embeddings import unpack_embedding
+from tools.ann_index import top_k
+from tools.bm25 import BM25Index, reciprocal_rank_fusion
+
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "4"))  # each ranking contributes limit * HYBRID_DEPTH candidates
+INDEX_COMPACT_RATIO = float(
+    os.getenv("INDEX_COMPACT_RATIO", "0.2")
+)  # compact once this fraction of the rows are deleted
+
+INDEXED_FIELDS = {
+    "filename": "filenames",
+    "fiscal_year": "fiscal_years",
+    "doc_type": "doc_types",
+    "page": "pages",
+}  # metadata index field -> per-row list it is read from
+ROW_COLUMNS = ("filenames", "chunk_indexes", "texts", "ids", "fiscal_years", "doc_types", "pages")
+
+
+class VectorIndex:
+    """Resident copy of the document_chunks embeddings.
+
+    Vectors are kept L2-normalised in one contiguous float32 matrix so cosine
+    similarity for every chunk is a single matrix-vector product. Metadata for
+    row i lives at position i of the parallel lists, and a metadata index maps
+    each (field, value) to its rows so filtered searches only score the rows
+    they can return. Approximate backends
+    (see tools/ann_index.py) can be registered to search a subset of the rows,
+    and a BM25 index over the same rows serves the lexical half of hybrid search.
+
+    Deleting rows only marks them dead (and drops them from the metadata, BM25
+    and ANN postings), so re-uploads never rebuild anything on the event loop.
+    compact() reclaims dead rows later, from a worker thread.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()  # ingestion and search can run on different threads
+        self._compacting = threading.Lock()  # one compaction at a time
+        self._reset(0)
+
+    def _reset(self, dim: int):
+        self.version = getattr(self, "version", 0) + 1  # bumped on every change so caches can tell they are stale
+        self.generation = getattr(self, "generation", 0) + 1  # bumped whenever row ids change meaning
+        self.dim = dim
+        self.size = 0
+        self._matrix = np.zeros(
+            (self.initial_capacity if dim else 0, dim), dtype=np.float32
+        )
+        self._live = np.ones(len(self._matrix), dtype=bool)  # False marks a deleted row
+        self.deleted = 0
+        self.filenames: List[str] = []
+        self.chunk_indexes: List[int] = []
+        self.texts: List[str] = []
+        self.ids: List[object] = []  # Mongo _id of each row, to match rows back to documents
+        self.fiscal_years: List[Optional[int]] = []
+        self.doc_types: List[Optional[str]] = []
+        self.pages: List[Optional[int]] = []  # 1-based PDF page a chunk starts on
+        self._rows_by_value: Dict[Tuple[str, Any], Set[int]] = {}  # (field, value) -> rows
+        self._row_arrays: Dict[Tuple[str, Any], np.ndarray] = {}  # sorted copies, made on first use
+        self.backends: Dict[str, object] = {}  # their row ids refer to this matrix, so they reset with it
+        self.lexical = BM25Index()  # same row ids, over self.texts
+
+    def _field_values(self, row: int) -> Dict[str, Any]:
+        return {field: getattr(self, column)[row] for field, column in INDEXED_FIELDS.items()}
+
+    def _index_row(self, row: int):
+        for field, value in self._field_values(row).items():
+            if value is not None:
+                self._rows_by_value.setdefault((field, value), set()).add(row)
+                self._row_arrays.pop((field, value), None)
+
+    def _unindex_row(self, row: int):
+        for field, value in self._field_values(row).items():
+            rows = self._rows_by_value.get((field, value))
+            if rows is not None:
+                rows.discard(row)
+                self._row_arrays.pop((field, value), None)
+                if not rows:
+                    del self._rows_by_value[(field, value)]
+
+    def _value_rows(self, key: Tuple[str, Any]) -> np.ndarray:
+        rows = self._row_arrays.get(key)
+        if rows is None:
+            rows = self._row_arrays[key] = np.fromiter(
+                sorted(self._rows_by_value.get(key, ())), dtype=np.int64
+            )
+        return rows
+
+    def rows_matching(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted rows that satisfy every filter, or None when there are none.
+        A filter value may be a list (any of). filename matches case-insensitive
+        substrings, so "netsol" selects every NetSol report."""
+        if not filters:
+            return None
+        rows = None
+        for field, wanted in filters.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"cannot filter on {field!r}, choose from {FILTER_FIELDS}")
+            if wanted is None:
+                continue
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            if field == "filename":
+                needles = [str(name).lower() for name in wanted]
+                keys = [
+                    key
+                    for key in self._rows_by_value
+                    if key[0] == "filename" and any(n in key[1].lower() for n in needles)
+                ]
+            else:
+                keys = [(field, value) for value in wanted]
+            arrays = [self._value_rows(key) for key in keys]
+            matched = np.unique(np.concatenate(arrays)) if arrays else np.zeros(0, dtype=np.int64)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        return rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[: self.size]  # view of the filled rows only, deleted ones included
+
+    @property
+    def count(self) -> int:
+        """Rows that are not deleted."""
+        return self.size - self.deleted
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Scale rows to unit length so a dot product equals cosine similarity.
+        cos(A, B) = (A.B) / (||A|| * ||B||), and with ||A|| = ||B|| = 1 that is just A.B"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0  # leave all-zero vectors as zeros instead of dividing by 0
+        return vectors / norms
+
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = max(capacity * 2, self.initial_capacity)  # doubling keeps appends amortised O(1)
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[: self.size] = self._matrix[: self.size]
+        self._matrix = grown
+        live = np.ones(capacity, dtype=bool)
+        live[: self.size] = self._live[: self.size]
+        self._live = live
+
+    def add(self, embeddings, metadata: List[Dict]):
+        """Append embeddings with their chunk metadata (filename, chunk_index, text, _id,
+        and optionally fiscal_year, doc_type, page)."""
+        if len(metadata) == 0:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if len(vectors) != len(metadata):
+            raise ValueError("embeddings and metadata must have the same length")
+
+        vectors = self._normalize(vectors)
+        with self._lock:
+            self._append(vectors, metadata)
+
+    def _append(self, vectors: np.ndarray, metadata: List[Dict]):
+        """add() for normalised vectors, with the lock already held."""
+        if self.dim == 0:
+            self._reset(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}"
+            )
+        self._grow(self.size + len(vectors))
+        self._matrix[self.size : self.size + len(vectors)] = vectors
+        for backend in self.backends.values():
+            backend.add(vectors, self.size)
+        for meta in metadata:
+            self.filenames.append(meta["filename"])
+            self.chunk_indexes.append(meta["chunk_index"])
+            self.texts.append(meta["text"])
+            self.ids.append(meta.get("_id"))
+            self.fiscal_years.append(meta.get("fiscal_year"))
+            self.doc_types.append(meta.get("doc_type"))
+            self.pages.append(meta.get("page"))
+            self._index_row(len(self.filenames) - 1)
+        self.lexical.add([meta["text"] for meta in metadata], self.size)
+        self.size += len(vectors)
+        self.version += 1
+
+    def _delete_rows(self, rows: List[int]):
+        """Mark `rows` deleted. Row ids stay put, so this costs O(len(rows)) plus
+        one pass over the ANN lists, however large the index is."""
+        for row in rows:
+            self._unindex_row(row)  # filtered searches no longer see them
+        rows = np.asarray(rows, dtype=np.int64)
+        self._live[rows] = False
+        self.deleted += len(rows)
+        self.lexical.remove(rows, [self.texts[row] for row in rows.tolist()])
+        for backend in self.backends.values():
+            backend.remove(rows)
+        self.version += 1
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.deleted > 0 and self.deleted >= INDEX_COMPACT_RATIO * self.size
+
+    def compact(self) -> bool:
+        """Drop deleted rows for good. The compacted matrix, metadata and BM25
+        index are built outside the lock from a snapshot and swapped in only if
+        the index did not change meanwhile, so searches and ingestion never wait
+        for the rebuild. Returns False when it lost that race (or another
+        compaction is running); the next caller tries again. Blocking, so run
+        it in a thread."""
+        if not self._compacting.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                if not self.deleted:
+                    return True
+                version, size = self.version, self.size
+                keep = self._live[:size].copy()
+                matrix = self.matrix  # rows below size are never written again, _grow copies
+                columns = {column: getattr(self, column)[:size] for column in ROW_COLUMNS}
+                lexical, postings = self.lexical, self.lexical.snapshot()
+
+            remaining = int(keep.sum())
+            remap = np.full(size, -1, dtype=np.int64)  # old row -> new row, -1 for deleted
+            remap[keep] = np.arange(remaining)
+            capacity = self.initial_capacity
+            while capacity < remaining:
+                capacity *= 2
+            compacted = np.zeros((capacity, self.dim), dtype=np.float32)
+            compacted[:remaining] = matrix[keep]
+            kept = keep.tolist()
+            columns = {
+                column: [value for value, k in zip(values, kept) if k]
+                for column, values in columns.items()
+            }
+            rows_by_value: Dict[Tuple[str, Any], Set[int]] = {}
+            for field, column in INDEXED_FIELDS.items():
+                for row, value in enumerate(columns[column]):
+                    if value is not None:
+                        rows_by_value.setdefault((field, value), set()).add(row)
+            compacted_lexical = lexical.compacted(postings, remap)
+
+            with self._lock:
+                if self.version != version:
+                    return False  # rows were added, deleted or renumbered meanwhile
+                self._matrix, self.size = compacted, remaining
+                self._live, self.deleted = np.ones(capacity, dtype=bool), 0
+                for column, values in columns.items():
+                    setattr(self, column, values)
+                self._rows_by_value, self._row_arrays = rows_by_value, {}
+                self.lexical = compacted_lexical
+                for backend in self.backends.values():
+                    backend.renumber(remap)
+                self.version += 1
+                self.generation += 1
+            lexical.release()  # outside the lock; freeing millions of postings at once would hold the GIL
+            return True
+        finally:
+            self._compacting.release()
+
+    def replace_file(
+        self, filename: str, renumbered: Dict[object, Dict], embeddings, metadata: List[Dict]
+    ):
+        """Swap the chunks of `filename` in one step: rows whose _id is a key of
+        `renumbered` stay (with chunk_index, page, fiscal_year and doc_type set from
+        its value), other rows of the file are dropped, and the new embeddings are
+        appended. Searches see either the old or the new set, never a mix."""
+        vectors = None
+        if len(metadata):
+            vectors = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(metadata), -1))
+        with self._lock:
+            stale = []
+            for row in sorted(self._rows_by_value.get(("filename", filename), ())):  # live rows only
+                if self.ids[row] in renumbered:
+                    fields = renumbered[self.ids[row]]
+                    self._unindex_row(row)
+                    self.chunk_indexes[row] = fields["chunk_index"]
+                    self.pages[row] = fields.get("page")
+                    self.fiscal_years[row] = fields.get("fiscal_year")
+                    self.doc_types[row] = fields.get("doc_type")
+                    self._index_row(row)
+                else:
+                    stale.append(row)
+            if stale:
+                self._delete_rows(stale)
+            if vectors is not None:
+                self._append(vectors, metadata)
+            self.version += 1
+
+    def snapshot(self) -> Tuple[np.ndarray, int]:
+        """(filled rows, generation), read together so an ANN backend can be
+        built from them outside the lock."""
+        with self._lock:
+            return self.matrix, self.generation
+
+    def register_backend(
+        self, backend, indexed_rows: int, state: Optional[Tuple] = None, generation: Optional[int] = None
+    ) -> bool:
+        """Make an ANN backend selectable by name. `state`, if given, is
+        installed into it first (see IVFIndex.install). Rows appended after it
+        was built from the first `indexed_rows` rows are handed to it here, and
+        rows deleted meanwhile are taken out of it. Returns False, changing
+        nothing, if the rows were compacted since `generation`."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if state is not None:
+                backend.install(*state)
+            backend.add(self.matrix[indexed_rows:], indexed_rows)
+            if self.deleted:
+                backend.remove(np.flatnonzero(~self._live[: self.size]))
+            self.backends[backend.name] = backend
+            return True
+
+    async def load(self, collection, batch_size: int = 1000):
+        """Build the index from the collection once, e.g. at server startup."""
+        cursor = collection.find(
+            {"embedding": {"$exists": True}},
+            {
+                "embedding": 1,
+                "embedding_dtype": 1,
+                "embedding_scale": 1,
+                "filename": 1,
+                "chunk_index": 1,
+                "text": 1,
+                "fiscal_year": 1,
+                "doc_type": 1,
+                "page": 1,
+            },
+        ).batch_size(batch_size)
+
+        embeddings, metadata = [], []
+        described: Dict[str, Dict] = {}  # filename -> metadata for chunks stored before it existed
+        with self._lock:
+            self._reset(0)
+        async for doc in cursor:
+            embeddings.append(unpack_embedding(doc))  # packed bytes decode with np.frombuffer
+            if "doc_type" not in doc:
+                if doc["filename"] not in described:
+                    described[doc["filename"]] = describe_document(doc["filename"])
+                doc.update(described[doc["filename"]])
+            metadata.append(doc)
+            if len(embeddings) >= batch_size:
+                self.add(embeddings, metadata)
+                embeddings, metadata = [], []
+        self.add(embeddings, metadata)
+        return self.size
+
+    def search(
+        self,
+        query_embedding,
+        limit: int = 5,
+        mode: str = "exact",
+        query_text: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict]:
+        """Return the `limit` most similar chunks, best first. `mode` names a
+        registered ANN backend; unknown or untrained backends fall back to exact.
+        With `query_text`, BM25 matches on the chunk text are fused in by
+        reciprocal rank so exact tokens like "2021" or "EBITDA" are not missed.
+        `filters` (see rows_matching) restrict both rankings to the matching
+        rows before anything is scored."""
+        with self._lock:
+            if self.count == 0 or limit <= 0:
+                return []
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+            query = self._normalize(query)[0]
+            depth = limit if query_text is None else limit * HYBRID_DEPTH  # fuse from deeper lists
+
+            subset = self.rows_matching(filters)
+            backend = self.backends.get(mode)
+            if subset is not None:
+                if len(subset) == 0:
+                    return []
+                subset_scores = self.matrix[subset] @ query  # exact, over the matching rows only
+                best = top_k(subset_scores, depth)
+                rows, scores = subset[best], subset_scores[best]
+            elif backend is not None and backend.is_trained:
+                rows, scores = backend.search(self.matrix, query, depth)
+            else:
+                all_scores = self.matrix @ query  # cosine similarity against every chunk at once
+                if self.deleted:
+                    all_scores[~self._live[: self.size]] = -np.inf  # deleted rows never rank
+                rows = top_k(all_scores, depth)
+                rows = rows[np.isfinite(all_scores[rows])]
+                scores = all_scores[rows]
+
+            if query_text is not None:
+                lexical_rows, _ = self.lexical.search(query_text, depth, subset)
+                rows = np.asarray(
+                    reciprocal_rank_fusion([rows, lexical_rows])[:limit], dtype=np.int64
+                )
+                scores = self.matrix[rows] @ query  # report cosine similarity for every fused row
+
+            return [
+                {
+                    "text": self.texts[i],
+                    "filename": self.filenames[i],
+                    "similarity": float(score),
+                    "chunk_index": self.chunk_indexes[i],
+                    "page": self.pages[i],
+                    "fiscal_year": self.fiscal_years[i],
+                }
+                for i, score in zip(rows, scores)
+            ]
+
+
+vector_index = VectorIndex()
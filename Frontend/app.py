@@ -1,6 +1,7 @@
 import gradio as gr
 import requests
 import json
+import time
 
 current_session_id = None
 
@@ -8,26 +9,43 @@ current_session_id = None
 def chat_with_ai(message, history):
     global current_session_id
 
+    history.append([message, ""])
     try:
-        response = requests.post(
-            "http://localhost:8000/chat/send",
+        with requests.post(
+            "http://localhost:8000/chat/stream",
             json={"message": message, "session_id": current_session_id},
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-            current_session_id = data["session_id"]
-            history.append(
-                [message, data["response"]]
-            )  # return the updated chat history
-
-            return history
-        else:
-            history.append([message, "Unable to connect to AI service."])
-            return history
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                history[-1][1] = "Unable to connect to AI service."
+                yield history
+                return
+
+            answer = ""
+            event = None
+            for line in response.iter_lines(decode_unicode=True):  # Server-Sent Events, one field per line
+                if line.startswith("event: "):
+                    event = line[len("event: ") :]
+                    continue
+                if not line.startswith("data: "):
+                    continue
+                data = json.loads(line[len("data: ") :])
+
+                if event == "session":
+                    current_session_id = data["session_id"]
+                elif event == "token":
+                    answer += data["content"]
+                    history[-1][1] = answer  # render the answer as it arrives
+                elif event == "tool" and data["status"] == "start" and not answer:
+                    history[-1][1] = f"_{data['message']}_"
+                elif event == "done":
+                    history[-1][1] = data["response"]
+                elif event == "error":
+                    history[-1][1] = data["detail"]
+                yield history
     except Exception as e:
-        history.append([message, f"Error: {str(e)}"])
-        return history
+        history[-1][1] = f"Error: {str(e)}"
+        yield history
 
 
 def save_document_to_db(file):
@@ -35,13 +53,21 @@ def save_document_to_db(file):
         return "No file selected"
 
     try:
-        files = {"file": open(file.name, "rb")}
-        response = requests.post("http://localhost:8000/documents/upload", files=files)
-        if response.status_code == 200:
-            result = response.json()
-            return f" {result['message']}"
-        else:
+        with open(file.name, "rb") as f:
+            response = requests.post(
+                "http://localhost:8000/documents/upload", files={"file": f}
+            )
+        if response.status_code != 202:
             return "Failed to save document"
+
+        status_url = "http://localhost:8000" + response.json()["status_url"]
+        while True:  # the upload returns straight away, so poll the job until it finishes
+            job = requests.get(status_url).json()
+            if job["stage"] == "done":
+                return f" {job['result']['message']}"
+            if job["stage"] == "failed":
+                return f"Error: {job['error']}"
+            time.sleep(1)
     except Exception as e:
         return f"Error: {str(e)}"
 
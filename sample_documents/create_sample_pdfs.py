@@ -11,15 +11,20 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from datetime import datetime
+import argparse
 import os
 
-def create_sample_document(year, company_name="TechCorp Solutions"):
+OUTPUT_DIR = os.getenv(
+    "SAMPLE_DOCUMENTS_DIR", os.path.dirname(os.path.abspath(__file__))
+)  # defaults to the folder this script lives in
+
+def create_sample_document(year, company_name="TechCorp Solutions", output_dir=OUTPUT_DIR, verbose=True):
     """Create a sample financial document for a given year"""
     
     # Create directory if it doesn't exist
-    os.makedirs("/Users/omerkhan/Netsol Projects/Chatbot/sample_documents", exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
     
-    filename = f"/Users/omerkhan/Netsol Projects/Chatbot/sample_documents/{company_name}_Annual_Report_{year}.pdf"
+    filename = os.path.join(output_dir, f"{company_name}_Annual_Report_{year}.pdf")
     doc = SimpleDocTemplate(filename, pagesize=letter)
     story = []
     
@@ -143,12 +148,15 @@ def create_sample_document(year, company_name="TechCorp Solutions"):
     
     # Build the PDF
     doc.build(story)
-    print(f"Created: {filename}")
+    if verbose:
+        print(f"Created: {filename}")
+    return filename
 
-def create_netsol_specific_document(year):
+def create_netsol_specific_document(year, output_dir=OUTPUT_DIR, verbose=True):
     """Create a Netsol-specific financial document"""
     
-    filename = f"/Users/omerkhan/Netsol Projects/Chatbot/sample_documents/NetSol_Technologies_Annual_Report_{year}.pdf"
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"NetSol_Technologies_Annual_Report_{year}.pdf")
     doc = SimpleDocTemplate(filename, pagesize=letter)
     story = []
     
@@ -261,21 +269,27 @@ def create_netsol_specific_document(year):
     
     # Build the PDF
     doc.build(story)
-    print(f"Created: {filename}")
+    if verbose:
+        print(f"Created: {filename}")
+    return filename
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create sample financial documents for testing")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="where to write the PDFs (or set SAMPLE_DOCUMENTS_DIR)")
+    args = parser.parse_args()
+
     print("Creating sample financial documents for testing...")
     
     # Create general tech company documents
     for year in range(2019, 2024):
-        create_sample_document(year, "TechCorp Solutions")
+        create_sample_document(year, "TechCorp Solutions", args.output_dir)
     
     # Create NetSol-specific documents
     for year in range(2019, 2024):
-        create_netsol_specific_document(year)
+        create_netsol_specific_document(year, args.output_dir)
     
     print("\nSample documents created successfully!")
-    print("Location: /Users/omerkhan/Netsol Projects/Chatbot/sample_documents/")
+    print(f"Location: {args.output_dir}")
     print("\nDocuments created:")
     print("• TechCorp Solutions Annual Reports (2019-2023)")
     print("• NetSol Technologies Annual Reports (2019-2023)")